@@ -8,15 +8,79 @@ import time
 import argparse
 import sys
 
+from async_writer import BackgroundWriter, SnapshotWriter, VideoRecorder
+from background_model import BackgroundModel
+from color_detection_demo import ColorDetectionDemo
+from color_labels import ColorLabeler
+from color_lut import ColorLUT
+from compositor import FeatherCompositor
+from frame_buffers import FramePool
+from frame_bus import FrameBus
+from frame_sources import open_frame_source
+from metrics import Metrics
+from motion_gate import MotionGate
+from overlay_cache import OverlayCache
+from preview_server import PreviewServer
+from quality_governor import QualityGovernor
+from roi_tracker import ROITracker
+from threaded_capture import ThreadedCapture
+from tiled_pipeline import TiledPipeline
+from warmup import WarmupMonitor
+
 class InvisibilityCloak:
     
+    # Reach of the mask cleanup (open, two dilations, median blur) in pixels, rounded up
+    MASK_HALO = 8
+    
+    REFINE_METHODS = ('separable', 'morph')
+    
     """Initialize camera settings and color detection parameters"""
-    def __init__(self, camera_index=0, width=640, height=480):
+    def __init__(self, camera_index=0, width=640, height=480, source=None, threaded_capture=False,
+                 use_lut=False, lut_bits=8, roi_tracking=False, roi_margin=32, rescan_interval=30,
+                 mask_scale=1.0, background_method='median', adaptive_background=False,
+                 learning_rate=0.02, metrics=None, cloak_colors=None, feather_radius=0,
+                 record_path=None, writer_policy='drop', target_fps=None, motion_gate=False,
+                 motion_threshold=8, refine_method='separable', color_config=None,
+                 preview_port=None, frame_bus=None, fast_start=False, warmup_threshold=2.0,
+                 warmup_max_seconds=3.0, tiles=0, tile_workers=None):
         self.camera_index = camera_index
         self.width = width
         self.height = height
+        # Camera index, video path, image directory, "raw:<path>" or a FrameSource
+        self.source = source if source is not None else camera_index
+        # Read frames on a producer thread so capture overlaps processing
+        self.threaded_capture = threaded_capture
         self.cap = None
         self.background = None
+        # Per-pixel median/trimmed mean over the capture frames
+        self.background_model = BackgroundModel(background_method, learning_rate=learning_rate)
+        # Keep blending non-cloak pixels into the background while running
+        self.adaptive_background = adaptive_background
+        # Reusable frame buffers, sized once the camera resolution is known
+        self.pool = None
+        # Stage timers and FPS; a disabled instance costs next to nothing
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        # Static text is rendered once into sprites instead of putText per frame
+        self.overlay_cache = OverlayCache()
+        # No windows or key handling (batch rendering on servers)
+        self.headless = False
+        # Snapshots and recordings are encoded on background threads
+        self.record_path = record_path
+        self.writer_policy = writer_policy
+        self.snapshots = None
+        self.recorder = None
+        # MJPEG stream of the output for browsers on other machines
+        self.preview_port = preview_port
+        self.preview = None
+        # Output frames and masks in shared memory for sidecar processes
+        self.frame_bus_name = frame_bus
+        self.frame_bus = None
+        # Skip the countdown and stop background capture once the camera has settled
+        self.fast_start = fast_start
+        self.warmup_threshold = warmup_threshold
+        self.warmup_max_seconds = warmup_max_seconds
+        # Set when the source is opened; cleared once the first composited frame is out
+        self._launch_time = None
         
         # HSV ranges for red color detection
         self.red_ranges = [
@@ -24,27 +88,113 @@ class InvisibilityCloak:
             (np.array([170, 120, 70]), np.array([180, 255, 255]))
         ]
         
+        # Demo palette plus any ranges tuned with hsv_tuner.py
+        palette = ColorDetectionDemo(color_config=color_config).colors if color_config or cloak_colors else None
+        if color_config and not cloak_colors:
+            self.red_ranges = palette['red']['ranges']
+        
+        # Optional multi-color cloak, labelled in a single pass
+        self.labeler = None
+        if cloak_colors:
+            unknown = [name for name in cloak_colors if name not in palette]
+            if unknown:
+                raise Exception(f"Unknown cloak colors {unknown}; known: {list(palette)}")
+            self.red_ranges = [r for name in cloak_colors for r in palette[name]['ranges']]
+            self.labeler = ColorLabeler({name: palette[name] for name in cloak_colors})
+        
+        # Precomputed BGR -> mask table (skips the HSV conversion entirely)
+        self.mask_lut = ColorLUT(self.red_ranges, bits=lut_bits) if use_lut else None
+        
         # Morphological kernel
         self.kernel = np.ones((3, 3), np.uint8)
+        self.dilate_iterations = 2
+        
+        # 'morph' runs each cleanup step as written; 'separable' fuses them (same output)
+        if refine_method not in self.REFINE_METHODS:
+            raise ValueError(f"refine_method must be one of {self.REFINE_METHODS}")
+        self.refine_method = refine_method
+        self._dilate_kernels = {}
+        
+        # Compute the mask at a fraction of the frame resolution (1.0 = full)
+        if not 0.0 < mask_scale <= 1.0:
+            raise ValueError("mask_scale must be in (0, 1]")
+        self.mask_scale = mask_scale
+        
+        # Only process the area around the cloak's last position
+        self.roi_margin = roi_margin
+        self.rescan_interval = rescan_interval
+        self.roi_tracker = ROITracker(roi_margin, rescan_interval) if roi_tracking else None
+        self._mask_region = None
+        
+        # Soft cloak edges through an alpha blend; it also replaces the median blur
+        self.compositor = FeatherCompositor(feather_radius) if feather_radius > 0 else None
+        self.median_blur = self.compositor is None
+        
+        # Reuse the previous mask where the scene has not changed
+        self.motion_gate = MotionGate(threshold=motion_threshold) if motion_gate else None
+        self._gated = None
+        
+        # Split each frame into strips processed in parallel (same output, lower latency)
+        self.tiler = TiledPipeline(self, tiles, tile_workers) if tiles > 1 else None
+        
+        # Trade mask quality for speed to hold a frame rate (overrides the settings above)
+        self.governor = None
+        if target_fps:
+            self.governor = QualityGovernor(target_fps)
+            self.set_quality(**self.governor.settings)
 
-    """Initialize the camera and validate its functionality"""
+    """Change the mask pipeline's cost/quality settings between frames"""
+    def set_quality(self, mask_scale, dilate_iterations, median_blur, roi_tracking):
+        self.mask_scale = mask_scale
+        self.dilate_iterations = dilate_iterations
+        # Feathered compositing always replaces the median blur
+        self.median_blur = median_blur and self.compositor is None
+        
+        if roi_tracking and self.roi_tracker is None:
+            self.roi_tracker = ROITracker(self.roi_margin, self.rescan_interval)
+            # The tracked mask buffer may hold anything; clear it all on first use
+            self._mask_region = None
+        elif not roi_tracking:
+            self.roi_tracker = None
+        
+        # A cached mask from the old settings must not be patched with new ones
+        self._reset_motion_gate()
+
+    """Drop the cached mask so the next frame is computed in full"""
+    def _reset_motion_gate(self):
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        self._gated = None
+
+    """Feed one frame's processing time to the governor and apply any level change"""
+    def _govern(self, frame_seconds):
+        settings = self.governor.update(frame_seconds)
+        if settings is not None:
+            self.set_quality(**settings)
+            print(f"Quality level {self.governor.level}: {settings}")
+        self.metrics.set_gauge('quality_level', self.governor.level)
+
+    """Initialize the frame source and validate its functionality"""
     def initialize_camera(self):
+        self._launch_time = time.perf_counter()
         try:
-            self.cap = cv2.VideoCapture(self.camera_index)
+            # Cameras get width/height/FPS applied; files keep their own size
+            self.cap = open_frame_source(self.source, self.width, self.height, 30)
             
             if not self.cap.isOpened():
-                raise Exception(f"Could not open camera at index {self.camera_index}")
+                raise Exception(f"Could not open frame source {self.source!r}")
             
-            # Set camera properties
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
-            self.cap.set(cv2.CAP_PROP_FPS, 30)
+            if self.threaded_capture:
+                self.cap = ThreadedCapture(self.cap)
             
             # Test frame capture
             ret, frame = self.cap.read()
             if not ret:
                 raise Exception("Could not capture test frame")
             
+            # Size the buffer pool from the frames the source actually delivers
+            self.pool = FramePool(frame.shape[1], frame.shape[0])
+            
             print(f"Camera initialized successfully!")
             print(f"Resolution: {int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))}")
             return True
@@ -57,6 +207,9 @@ class InvisibilityCloak:
             
     """Capture and store the static background image"""
     def capture_background(self, frames_to_capture=60, countdown_time=3):
+        if self.fast_start:
+            return self.capture_background_converged(max_frames=max(frames_to_capture, 90))
+        
         print(f"Background capture will start in {countdown_time} seconds...")
         print("Please move out of the camera view!")
         
@@ -66,6 +219,7 @@ class InvisibilityCloak:
             time.sleep(1)
         
         print("Capturing background... Stay out of frame!")
+        self.background_model.reset()
         
         # Capture multiple frames to let camera adjust
         for i in range(frames_to_capture):
@@ -77,60 +231,249 @@ class InvisibilityCloak:
             if i % 10 == 0:
                 print(f"Progress: {i+1}/{frames_to_capture}")
             
-            # Store the last frame as background
-            self.background = cv2.flip(frame, 1)
+            # Feed the model; it keeps a bounded, evenly spaced sample
+            self.background_model.add(cv2.flip(frame, 1))
+        
+        self.background = self.background_model.finalize()
         
         print("Background captured successfully!")
         return True
         
+    """Capture the background as soon as exposure and white balance stop changing"""
+    def capture_background_converged(self, max_frames=90):
+        print("Fast start: capturing background once the camera settles... Stay out of frame!")
+        start = time.perf_counter()
+        monitor = WarmupMonitor(self.warmup_threshold, max_frames=max_frames, max_seconds=self.warmup_max_seconds)
+        self.background_model.reset()
+        
+        while not monitor.done:
+            ret, frame = self.cap.read()
+            if not ret:
+                raise Exception("Failed to capture background frame")
+            
+            frame = cv2.flip(frame, 1)
+            # Only the frames of the current stable run make up the background,
+            # so a new run (or a black startup frame) drops what came before
+            if not monitor.update(frame):
+                self.background_model.reset()
+            self.background_model.add(frame)
+        
+        self.background = self.background_model.finalize()
+        
+        elapsed = time.perf_counter() - start
+        if monitor.converged:
+            print(f"Background captured after {monitor.frames} frames ({elapsed:.2f}s)")
+        elif not monitor.last_usable:
+            print(f"Warning: camera only sent black or flat frames for {monitor.frames} frames ({elapsed:.2f}s); "
+                  f"using the last one")
+        else:
+            print(f"Warning: camera still changing after {monitor.frames} frames ({elapsed:.2f}s); "
+                  f"using the last {self.background_model.frames_seen} frames")
+        self.metrics.set_gauge('warmup_frames', monitor.frames)
+        return True
+
+    """Return a pooled scratch buffer, or None to let OpenCV allocate"""
+    def _buffer(self, name, shape):
+        if self.pool is None:
+            return None
+        return self.pool.get(name, shape)
+        
     """Generate a binary mask to detect red-colored regions"""
-    def create_red_mask(self, hsv_frame):
-        masks = []
+    def create_red_mask(self, hsv_frame, dst=None):
+        shape = hsv_frame.shape[:2]
         
-        # Create masks for both red ranges
-        for lower, upper in self.red_ranges:
-            mask = cv2.inRange(hsv_frame, lower, upper)
-            masks.append(mask)
+        # Create masks for both red ranges and combine them in place
+        lower, upper = self.red_ranges[0]
+        combined_mask = cv2.inRange(hsv_frame, lower, upper, dst=self._buffer('mask_raw', shape))
+        for lower, upper in self.red_ranges[1:]:
+            mask = cv2.inRange(hsv_frame, lower, upper, dst=self._buffer('mask_low', shape))
+            combined_mask = cv2.bitwise_or(combined_mask, mask, dst=combined_mask)
         
-        # Combine masks
-        combined_mask = cv2.bitwise_or(masks[0], masks[1])
+        return self.refine_mask(combined_mask, dst)
+        
+    """Clean up a raw color mask with morphological operations"""
+    def refine_mask(self, combined_mask, dst=None):
+        shape = combined_mask.shape
+        if dst is None:
+            dst = self._buffer('mask', shape)
+        if self.refine_method == 'separable':
+            return self.refine_mask_separable(combined_mask, dst)
         
         # Refine mask using morphological operations
         # Remove noise
-        combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_OPEN, self.kernel)
+        combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_OPEN, self.kernel,
+                                         dst=self._buffer('mask_open', shape))
         
-        # Fill holes and expand regions
-        combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_DILATE, self.kernel, iterations=2)
+        # Fill holes and expand regions (straight into dst when nothing follows)
+        dilated = self._buffer('mask_dilate', shape) if self.median_blur else dst
+        combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_DILATE, self.kernel,
+                                         dst=dilated, iterations=self.dilate_iterations)
         
-        # Optional: Gaussian blur for smoother edges
-        combined_mask = cv2.medianBlur(combined_mask, 5)
+        # Optional: Gaussian blur for smoother edges (feathered compositing smooths them instead)
+        if self.median_blur:
+            combined_mask = cv2.medianBlur(combined_mask, 5, dst=dst)
         
         return combined_mask
         
-    """Apply the invisibility effect using the red mask"""
-    def apply_invisibility_effect(self, frame, mask):
-        # Create inverted mask
-        mask_inv = cv2.bitwise_not(mask)
+    """Same cleanup as refine_mask's morphology path in two min/max passes and one box filter"""
+    def refine_mask_separable(self, combined_mask, dst=None):
+        shape = combined_mask.shape
+        
+        # OPEN followed by n 3x3 dilations is one 3x3 erosion and one (2n + 3)-square
+        # dilation; OpenCV runs rectangular kernels as separable row/column passes
+        size = 2 * self.dilate_iterations + 3
+        kernel = self._dilate_kernels.get(size)
+        if kernel is None:
+            kernel = self._dilate_kernels[size] = cv2.getStructuringElement(cv2.MORPH_RECT, (size, size))
+        
+        eroded = cv2.erode(combined_mask, self.kernel, dst=self._buffer('mask_open', shape))
+        dilated = self._buffer('mask_dilate', shape) if self.median_blur else dst
+        combined_mask = cv2.dilate(eroded, kernel, dst=dilated)
+        
+        if self.median_blur:
+            # On a 0/255 mask the 5x5 median is a majority vote: set iff 13 of the 25 are.
+            # The mean is then >= 133, otherwise <= 122 (replicated border like medianBlur)
+            density = cv2.blur(combined_mask, (5, 5), dst=self._buffer('mask_density', shape),
+                               borderType=cv2.BORDER_REPLICATE)
+            _, combined_mask = cv2.threshold(density, 127, 255, cv2.THRESH_BINARY, dst=dst)
+        
+        return combined_mask
+        
+    """Build the refined red mask straight from a BGR frame"""
+    def compute_mask(self, frame, dst=None):
+        if self.mask_scale < 1.0:
+            return self.compute_mask_scaled(frame, dst)
+        return self.compute_mask_native(frame, dst)
+        
+    """Build the refined red mask at the frame's own resolution"""
+    def compute_mask_native(self, frame, dst=None):
+        if self.mask_lut is not None:
+            raw = self.mask_lut.apply(frame, self._buffer('mask_raw', frame.shape[:2]))
+            return self.refine_mask(raw, dst)
+        
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=self._buffer('hsv', frame.shape))
+        if self.labeler is not None:
+            shape = frame.shape[:2]
+            color_bits = self.labeler.classify(hsv, dst=self._buffer('color_bits', shape))
+            raw = self.labeler.mask(color_bits, self.labeler.names, dst=self._buffer('mask_raw', shape))
+            return self.refine_mask(raw, dst)
+        return self.create_red_mask(hsv, dst)
+        
+    """Compute the mask on a downscaled frame and upsample it with smoothing"""
+    def compute_mask_scaled(self, frame, dst=None):
+        height, width = frame.shape[:2]
+        small_width = max(1, int(round(width * self.mask_scale)))
+        small_height = max(1, int(round(height * self.mask_scale)))
+        if dst is None:
+            dst = self._buffer('mask', (height, width))
+        
+        # Area averaging keeps thin cloak edges when shrinking
+        small = cv2.resize(frame, (small_width, small_height),
+                           dst=self._buffer('frame_small', (small_height, small_width, 3)),
+                           interpolation=cv2.INTER_AREA)
+        small_mask = self.compute_mask_native(small, dst=self._buffer('mask_small', (small_height, small_width)))
+        
+        # Bilinear upsampling then re-thresholding gives smooth, not blocky, edges
+        upsampled = cv2.resize(small_mask, (width, height),
+                               dst=self._buffer('mask_upsampled', (height, width)),
+                               interpolation=cv2.INTER_LINEAR)
+        _, mask = cv2.threshold(upsampled, 127, 255, cv2.THRESH_BINARY, dst=dst)
         
-        # Segment the image
-        # Part without the cloak
-        frame_no_cloak = cv2.bitwise_and(frame, frame, mask=mask_inv)
+        return mask
+        
+    """Build the red mask only inside the tracked cloak region"""
+    def compute_mask_tracked(self, frame):
+        mask = self.pool.get('mask_tracked', frame.shape[:2])
+        
+        # Clear what the previous frame wrote; everything else is already zero
+        if self._mask_region is None:
+            mask.fill(0)
+        else:
+            x, y, w, h = self._mask_region
+            mask[y:y + h, x:x + w] = 0
+        
+        region = self.roi_tracker.next_region(frame.shape)
+        x, y, w, h = region
+        region_mask = self.compute_mask(frame[y:y + h, x:x + w], dst=mask[y:y + h, x:x + w])
+        self._mask_region = region
+        
+        # Only the cloak's bounding box needs compositing
+        return mask, self.roi_tracker.update(region_mask, region)
+        
+    """Build the mask (and cloak region) for a frame, tracked or full-frame"""
+    def compute_mask_region(self, frame, dst=None):
+        if self.roi_tracker is None:
+            return self.compute_mask(frame, dst), None
+        
+        mask, region = self.compute_mask_tracked(frame)
+        if region is None:
+            # No cloak in view: nothing to composite
+            region = (0, 0, 0, 0)
+        return mask, region
+        
+    """Reuse the last mask where the frame has not changed, recomputing only changed tiles"""
+    def compute_mask_gated(self, frame):
+        # Patching tiles needs an untracked, full-resolution mask
+        allow_tiles = self.roi_tracker is None and self.mask_scale == 1.0
+        regions = self.motion_gate.changed_regions(frame, allow_tiles)
+        
+        if regions is None or self._gated is None:
+            self._gated = self.compute_mask_region(frame, dst=self.pool.get('mask_cached', frame.shape[:2]))
+        elif regions:
+            self.metrics.increment('mask_tiles', len(regions))
+            for tile in regions:
+                self.recompute_mask_tile(frame, self._gated[0], tile)
+        else:
+            self.metrics.increment('mask_reused')
+        
+        return self._gated
+        
+    """Recompute the cached mask around one changed tile"""
+    def recompute_mask_tile(self, frame, mask, tile):
+        height, width = mask.shape
+        halo = self.MASK_HALO
+        x, y, w, h = tile
+        
+        # A change inside the tile moves the mask up to one halo beyond it, and
+        # computing one more halo around that keeps the written pixels exact
+        wx0, wy0 = max(0, x - halo), max(0, y - halo)
+        wx1, wy1 = min(width, x + w + halo), min(height, y + h + halo)
+        cx0, cy0 = max(0, wx0 - halo), max(0, wy0 - halo)
+        cx1, cy1 = min(width, wx1 + halo), min(height, wy1 + halo)
+        
+        tile_mask = self.compute_mask(frame[cy0:cy1, cx0:cx1],
+                                      dst=self.pool.get('mask_tile', (cy1 - cy0, cx1 - cx0)))
+        mask[wy0:wy1, wx0:wx1] = tile_mask[wy0 - cy0:wy1 - cy0, wx0 - cx0:wx1 - cx0]
+        
+    """Apply the invisibility effect using the red mask"""
+    def apply_invisibility_effect(self, frame, mask, dst=None, region=None):
+        if self.compositor is not None:
+            return self.compositor.composite(frame, self.background, mask, dst=dst,
+                                             region=region, pool=self.pool)
         
-        # Background part to show through cloak
-        background_cloak = cv2.bitwise_and(self.background, self.background, mask=mask)
+        # Start from the frame (dst may be the frame itself for in-place use)
+        if dst is None:
+            dst = frame.copy()
+        elif dst is not frame:
+            np.copyto(dst, frame)
         
-        # Combine both parts
-        final_frame = cv2.add(frame_no_cloak, background_cloak)
+        # Single masked copy of the background through the cloak
+        if region is None:
+            cv2.copyTo(self.background, mask, dst)
+        elif region[2] > 0 and region[3] > 0:
+            x, y, w, h = region
+            cv2.copyTo(self.background[y:y + h, x:x + w], mask[y:y + h, x:x + w], dst[y:y + h, x:x + w])
         
-        return final_frame
+        return dst
         
     """Overlay status and control information on the frame"""
     def add_info_overlay(self, frame):
         # Add text overlay
         font = cv2.FONT_HERSHEY_SIMPLEX
-        cv2.putText(frame, "Invisibility Cloak Active", (10, 30), font, 0.7, (0, 255, 0), 2)
-        cv2.putText(frame, "Press 'q' to quit, 'r' to recapture background", (10, 60), font, 0.5, (255, 255, 255), 1)
-        return frame
+        return self.overlay_cache.draw(frame, 'info', (
+            ("Invisibility Cloak Active", (10, 30), font, 0.7, (0, 255, 0), 2),
+            ("Press 'q' to quit, 'r' to recapture background", (10, 60), font, 0.5, (255, 255, 255), 1),
+        ))
 
     """Run the main invisibility cloak loop and handle user inputs"""
     def run_invisibility_cloak(self, show_debug=False):
@@ -146,34 +489,35 @@ class InvisibilityCloak:
             print("  'q' - Quit")
             print("  'r' - Recapture background")
             print("  's' - Save current frame")
+            print("  'v' - Start/stop recording")
             print("\nWear something bright red to become invisible!")
             
             frame_count = 0
+            self.snapshots = SnapshotWriter(policy=self.writer_policy, metrics=self.metrics)
+            if self.record_path:
+                self.start_recording(self.record_path)
+            self.start_outputs()
+            
+            # The threaded reader hands out its own ring buffers
+            capture_buffer = None if self.threaded_capture else self.pool.get('capture')
             
             while True:
                 # Read frame
-                ret, frame = self.cap.read()
+                with self.metrics.stage('capture'):
+                    ret, frame = self.cap.read(capture_buffer)
                 if not ret:
                     print("Failed to capture frame")
                     break
                 
-                # Flip for mirror effect
-                frame = cv2.flip(frame, 1)
-                
-                # Convert to HSV
-                hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+                # Capture waits are not ours to budget; time from here to the display
+                frame_start = time.perf_counter()
+                frame, result, mask = self.process_frame(frame, keep_original=show_debug)
                 
-                # Create red mask
-                mask = self.create_red_mask(hsv)
-                
-                # Apply invisibility effect
-                result = self.apply_invisibility_effect(frame, mask)
-                
-                # Add info overlay
-                result = self.add_info_overlay(result)
+                self.publish_output(result, mask)
                 
                 # Display result
-                cv2.imshow('Invisibility Cloak', result)
+                with self.metrics.stage('display'):
+                    cv2.imshow('Invisibility Cloak', result)
                 
                 # Debug windows
                 if show_debug:
@@ -181,6 +525,9 @@ class InvisibilityCloak:
                     cv2.imshow('Mask', mask)
                     cv2.imshow('Background', self.background)
                 
+                if self.governor is not None:
+                    self._govern(time.perf_counter() - frame_start)
+                
                 # Handle key presses
                 key = cv2.waitKey(1) & 0xFF
                 
@@ -190,12 +537,25 @@ class InvisibilityCloak:
                 elif key == ord('r'):
                     print("Recapturing background...")
                     self.capture_background(frames_to_capture=30, countdown_time=2)
+                    if self.roi_tracker is not None:
+                        self.roi_tracker.reset()
+                    self._reset_motion_gate()
                 elif key == ord('s'):
                     filename = f"invisibility_frame_{frame_count:04d}.jpg"
-                    cv2.imwrite(filename, result)
-                    print(f"Frame saved as {filename}")
+                    if self.snapshots.save(filename, result):
+                        print(f"Saving frame as {filename}")
+                    else:
+                        print("Snapshot dropped: writer is busy")
+                elif key == ord('v'):
+                    if self.recorder is None:
+                        self.start_recording(f"invisibility_recording_{frame_count:04d}.mp4")
+                    else:
+                        self.stop_recording()
                 
                 frame_count += 1
+                if isinstance(self.cap, ThreadedCapture):
+                    self.metrics.set_counter('frames_dropped', self.cap.frames_dropped)
+                self.metrics.frame_done()
             
             return True
             
@@ -208,6 +568,167 @@ class InvisibilityCloak:
         finally:
             self.cleanup()
 
+    """Mirror, mask and composite one captured frame; returns (frame, result, mask)"""
+    def process_frame(self, frame, keep_original=False):
+        metrics = self.metrics
+        
+        if self.tiler is not None and self.tiler.applies():
+            # Mirror, mask and composite per strip on the tile pool
+            with metrics.stage('tiled'):
+                frame, result, mask = self.tiler.process(frame, keep_original)
+        else:
+            # Flip for mirror effect
+            with metrics.stage('flip'):
+                frame = cv2.flip(frame, 1, dst=self.pool.get('frame', frame.shape))
+            
+            # Create red mask
+            with metrics.stage('mask'):
+                if self.motion_gate is not None:
+                    mask, region = self.compute_mask_gated(frame)
+                else:
+                    mask, region = self.compute_mask_region(frame)
+            
+            # Follow lighting changes outside the cloak (before compositing touches the frame)
+            if self.adaptive_background:
+                with metrics.stage('background_update'):
+                    self.background_model.update(frame, mask)
+            
+            # Apply invisibility effect, in place unless the caller needs the original
+            with metrics.stage('composite'):
+                output = self.pool.get('output', frame.shape) if keep_original else frame
+                result = self.apply_invisibility_effect(frame, mask, dst=output, region=region)
+        
+        # Add info overlay (the key help is pointless in rendered files)
+        with metrics.stage('overlay'):
+            if not self.headless:
+                result = self.add_info_overlay(result)
+            metrics.draw_overlay(result)
+        
+        if self._launch_time is not None:
+            elapsed = time.perf_counter() - self._launch_time
+            self._launch_time = None
+            print(f"Time to first composited frame: {elapsed:.2f}s")
+            metrics.set_gauge('time_to_first_frame_ms', round(elapsed * 1000))
+        
+        return frame, result, mask
+
+    """Stream frames through the pipeline into a video file without any GUI"""
+    def run_headless(self, output_path=None, background_frames=30):
+        self.headless = True
+        start_time = time.perf_counter()
+        
+        if not self.initialize_camera():
+            return False
+        
+        try:
+            self.prepare_headless(output_path, background_frames)
+            
+            frames = 0
+            capture_buffer = None if self.threaded_capture else self.pool.get('capture')
+            render_start = time.perf_counter()
+            
+            while self.render_next(capture_buffer):
+                frames += 1
+            
+            # The file is only complete once the encoder has drained its queue
+            self.stop_recording()
+            render_time = time.perf_counter() - render_start
+            wall_time = time.perf_counter() - start_time
+            fps = frames / render_time if render_time > 0 else 0.0
+            print(f"Processed {frames} frames in {render_time:.2f}s ({fps:.1f} FPS)")
+            print(f"Total wall time: {wall_time:.2f}s")
+            if output_path:
+                print(f"Output written to {output_path}")
+            return True
+            
+        except KeyboardInterrupt:
+            print("\nInterrupted by user")
+            return True
+        except Exception as e:
+            print(f"Error during execution: {e}")
+            return False
+        finally:
+            self.cleanup()
+
+    """Background from the leading frames, rewind and open the output (source already initialized)"""
+    def prepare_headless(self, output_path=None, background_frames=30):
+        self.headless = True
+        # No one to step out of view: the leading frames are the background
+        self.capture_background(frames_to_capture=background_frames, countdown_time=0)
+        
+        # Render recordings from their first frame; cameras, streams and threaded readers carry on
+        if self.cap.is_live or self.threaded_capture or not self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+            print(f"Rendering starts after the {background_frames} background frames")
+        
+        if output_path:
+            # Encode on a worker thread; blocking keeps every frame in the file
+            height, width = self.background.shape[:2]
+            self.recorder = VideoRecorder(output_path, self.cap.get(cv2.CAP_PROP_FPS), (width, height),
+                                          policy='block', metrics=self.metrics)
+        self.start_outputs()
+
+    """Capture, process and record one frame without any GUI; False at the end of the source"""
+    def render_next(self, capture_buffer=None):
+        with self.metrics.stage('capture'):
+            ret, frame = self.cap.read(capture_buffer)
+        if not ret:
+            return False
+        
+        frame_start = time.perf_counter()
+        frame, result, mask = self.process_frame(frame)
+        
+        self.publish_output(result, mask)
+        
+        if self.governor is not None:
+            self._govern(time.perf_counter() - frame_start)
+        
+        self.metrics.frame_done()
+        return True
+
+    """Start encoding the output stream to a video file in the background"""
+    def start_recording(self, path):
+        height, width = self.background.shape[:2]
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.recorder = VideoRecorder(path, fps, (width, height), policy=self.writer_policy, metrics=self.metrics)
+        print(f"Recording to {path}")
+
+    """Flush and close the current recording"""
+    def stop_recording(self):
+        if self.recorder is None:
+            return
+        recorder, self.recorder = self.recorder, None
+        recorder.close()
+        self._report_writer(recorder, f"Recording saved to {recorder.path}")
+
+    """Open the preview server and frame bus if they were requested"""
+    def start_outputs(self):
+        if self.preview_port is not None and self.preview is None:
+            self.preview = PreviewServer(port=self.preview_port, metrics=self.metrics)
+            print(f"Preview at {self.preview.url} (stream: {self.preview.url}stream.mjpg)")
+        if self.frame_bus_name and self.frame_bus is None:
+            self.frame_bus = FrameBus(self.frame_bus_name, self.background.shape)
+            print(f"Publishing frames and masks on frame bus {self.frame_bus_name!r}")
+
+    """Hand a finished frame to the recording, preview and frame bus"""
+    def publish_output(self, result, mask):
+        if self.recorder is not None:
+            with self.metrics.stage('record'):
+                self.recorder.write(result)
+        
+        if self.preview is not None:
+            with self.metrics.stage('preview'):
+                self.preview.publish(result)
+        
+        if self.frame_bus is not None:
+            with self.metrics.stage('frame_bus'):
+                self.frame_bus.publish(result, mask)
+
+    """Print what a background writer did, including frames lost to backpressure"""
+    def _report_writer(self, writer, message):
+        stats = writer.stats()
+        print(f"{message}: {stats['written']} frames written, {stats['dropped']} dropped, "
+              f"{stats['blocked']} waits for the encoder")
+
     """Test and verify live camera feed"""
     def test_camera(self):
         if not self.initialize_camera():
@@ -226,8 +747,10 @@ class InvisibilityCloak:
                 
                 # Add test overlay
                 font = cv2.FONT_HERSHEY_SIMPLEX
-                cv2.putText(frame, "Camera Test Mode", (10, 30), font, 1, (0, 255, 0), 2)
-                cv2.putText(frame, "Press 'q' to exit", (10, 70), font, 0.7, (255, 255, 255), 2)
+                self.overlay_cache.draw(frame, 'test', (
+                    ("Camera Test Mode", (10, 30), font, 1, (0, 255, 0), 2),
+                    ("Press 'q' to exit", (10, 70), font, 0.7, (255, 255, 255), 2),
+                ))
                 
                 cv2.imshow('Camera Test', frame)
                 
@@ -245,34 +768,158 @@ class InvisibilityCloak:
 
     """Release camera and close all OpenCV windows"""
     def cleanup(self):
+        self.stop_recording()
+        if self.snapshots is not None:
+            self.snapshots.close()
+            if self.snapshots.frames_submitted:
+                self._report_writer(self.snapshots, "Snapshots")
+            self.snapshots = None
+        if self.preview is not None:
+            self.preview.close()
+            stats = self.preview.stats()
+            print(f"Preview: {stats['encoded']} frames encoded, {stats['dropped']} skipped by the encoder, "
+                  f"{stats['sent']} sent to clients")
+            self.preview = None
+        if self.frame_bus is not None:
+            print(f"Frame bus: {self.frame_bus.frames_published} frames published")
+            self.frame_bus.close()
+            self.frame_bus = None
+        if self.tiler is not None:
+            self.tiler.close()
+        if isinstance(self.cap, ThreadedCapture):
+            stats = self.cap.stats()
+            print(f"Capture: {stats['captured']} frames, {stats['delivered']} processed, {stats['dropped']} dropped")
+        if self.metrics.enabled:
+            # Final flush so short runs still leave a record
+            self.metrics.export()
+            print(f"Average FPS: {self.metrics.fps():.1f}")
         if self.cap:
             self.cap.release()
-        cv2.destroyAllWindows()
+        if not self.headless:
+            cv2.destroyAllWindows()
         print("Resources cleaned up successfully")
 
 """Parse arguments and run the invisibility cloak or camera test"""
 def main():
     parser = argparse.ArgumentParser(description='Invisibility Cloak using OpenCV')
     parser.add_argument('--camera', type=int, default=0, help='Camera index (default: 0)')
+    parser.add_argument('--source', '--input', dest='source', type=str, default=None,
+                        help='Frame source instead of the camera: video file, image directory or raw:<path|-> BGR24 stream')
     parser.add_argument('--width', type=int, default=640, help='Camera width (default: 640)')
     parser.add_argument('--height', type=int, default=480, help='Camera height (default: 480)')
+    parser.add_argument('--threaded', action='store_true', help='Capture frames on a background thread')
+    parser.add_argument('--lut', action='store_true', help='Use a precomputed BGR lookup table for color detection')
+    parser.add_argument('--lut-bits', type=int, default=8, help='Bits per channel for the lookup table (default: 8, exact)')
+    parser.add_argument('--roi', action='store_true', help='Track the cloak and only process the region around it')
+    parser.add_argument('--roi-margin', type=int, default=32, help='Pixels added around the tracked region (default: 32)')
+    parser.add_argument('--rescan-interval', type=int, default=30, help='Frames between full-frame rescans in ROI mode (default: 30)')
+    parser.add_argument('--mask-scale', type=float, default=1.0, help='Compute the mask at this fraction of the resolution, e.g. 0.5 (default: 1.0)')
+    parser.add_argument('--background-method', choices=BackgroundModel.METHODS, default='median',
+                        help='How capture frames are combined into the background (default: median)')
+    parser.add_argument('--adaptive-background', action='store_true', help='Keep updating non-cloak background pixels while running')
+    parser.add_argument('--learning-rate', type=float, default=0.02, help='Running average rate for the adaptive background (default: 0.02)')
+    parser.add_argument('--metrics', action='store_true', help='Collect per-stage latency and FPS metrics')
+    parser.add_argument('--metrics-overlay', action='store_true', help='Draw FPS and stage latency on the output (implies --metrics)')
+    parser.add_argument('--metrics-file', type=str, default=None, help='Export metrics to this file (implies --metrics)')
+    parser.add_argument('--metrics-format', choices=['jsonl', 'prometheus'], default='jsonl', help='Metrics file format (default: jsonl)')
+    parser.add_argument('--metrics-interval', type=float, default=5.0, help='Seconds between metrics exports (default: 5)')
+    parser.add_argument('--cloak-colors', nargs='+', default=None,
+                        help=f'Treat all of these colors as the cloak: {", ".join(ColorDetectionDemo().colors)} '
+                             'or any color in --color-config (default: red)')
+    parser.add_argument('--color-config', type=str, default=None,
+                        help='JSON color ranges written by hsv_tuner.py; a tuned red replaces the built-in cloak range')
+    parser.add_argument('--feather', type=int, default=0,
+                        help='Feather the cloak edges over this many pixels with an alpha blend (default: 0, hard edges)')
+    parser.add_argument('--output', type=str, default=None, help='Write the result to this video file (implies --headless)')
+    parser.add_argument('--headless', action='store_true', help='Process without windows or key handling, then report FPS')
+    parser.add_argument('--background-frames', type=int, default=30,
+                        help='Leading frames used as the background in headless mode (default: 30)')
+    parser.add_argument('--record', type=str, default=None, help='Record the output to this video file while running')
+    parser.add_argument('--writer-policy', choices=BackgroundWriter.POLICIES, default='drop',
+                        help='When the snapshot/recording queue is full: drop the frame or block the loop (default: drop)')
+    parser.add_argument('--target-fps', type=float, default=None,
+                        help='Adapt mask resolution, morphology, blur and ROI mode to hold this frame rate')
+    parser.add_argument('--motion-gate', action='store_true',
+                        help='Reuse the previous mask where the scene did not change, recomputing only changed tiles')
+    parser.add_argument('--motion-threshold', type=int, default=8,
+                        help='Per-channel difference on the downsampled frame that counts as a change (default: 8)')
+    parser.add_argument('--refine', choices=InvisibilityCloak.REFINE_METHODS, default='separable',
+                        help='Mask cleanup: fused separable passes or the step-by-step morphology (same output; default: separable)')
+    parser.add_argument('--preview-port', type=int, default=None,
+                        help='Serve the output as an MJPEG stream on this port (open http://<host>:<port>/ in a browser)')
+    parser.add_argument('--frame-bus', type=str, default=None, metavar='NAME',
+                        help='Publish output frames and masks to a shared-memory ring other processes can map')
+    parser.add_argument('--fast-start', action='store_true',
+                        help='No countdown; capture the background as soon as the camera image stops changing')
+    parser.add_argument('--warmup-threshold', type=float, default=2.0,
+                        help='Largest mean drift (0-255) from the start of a stable run that counts as settled in --fast-start (default: 2)')
+    parser.add_argument('--warmup-max-seconds', type=float, default=3.0,
+                        help='Longest --fast-start wait for the camera to settle (default: 3)')
+    parser.add_argument('--tiles', type=int, default=0,
+                        help='Process each frame as this many strips in parallel (same output; default: off)')
+    parser.add_argument('--tile-workers', type=int, default=None,
+                        help='Threads for --tiles (default: one per CPU)')
     parser.add_argument('--test', action='store_true', help='Run camera test only')
     parser.add_argument('--debug', action='store_true', help='Show debug windows')
     
     args = parser.parse_args()
     
-    # Create invisibility cloak instance
-    cloak = InvisibilityCloak(
-        camera_index=args.camera,
-        width=args.width,
-        height=args.height
+    metrics = Metrics(
+        enabled=args.metrics or args.metrics_overlay or args.metrics_file is not None,
+        export_path=args.metrics_file,
+        export_format=args.metrics_format,
+        export_interval=args.metrics_interval,
+        overlay=args.metrics_overlay
     )
     
+    # Create invisibility cloak instance
+    try:
+        cloak = InvisibilityCloak(
+            camera_index=args.camera,
+            width=args.width,
+            height=args.height,
+            source=args.source,
+            threaded_capture=args.threaded,
+            use_lut=args.lut,
+            lut_bits=args.lut_bits,
+            roi_tracking=args.roi,
+            roi_margin=args.roi_margin,
+            rescan_interval=args.rescan_interval,
+            mask_scale=args.mask_scale,
+            background_method=args.background_method,
+            adaptive_background=args.adaptive_background,
+            learning_rate=args.learning_rate,
+            metrics=metrics,
+            cloak_colors=args.cloak_colors,
+            feather_radius=args.feather,
+            record_path=args.record,
+            writer_policy=args.writer_policy,
+            target_fps=args.target_fps,
+            motion_gate=args.motion_gate,
+            motion_threshold=args.motion_threshold,
+            refine_method=args.refine,
+            color_config=args.color_config,
+            preview_port=args.preview_port,
+            frame_bus=args.frame_bus,
+            fast_start=args.fast_start,
+            warmup_threshold=args.warmup_threshold,
+            warmup_max_seconds=args.warmup_max_seconds,
+            tiles=args.tiles,
+            tile_workers=args.tile_workers
+        )
+    except Exception as e:
+        # Bad settings, e.g. unknown --cloak-colors or too many ranges to label at once
+        print(f"Error: {e}")
+        sys.exit(1)
+    
     print("=== Advanced Invisibility Cloak ===")
     
     if args.test:
         print("Running camera test...")
         success = cloak.test_camera()
+    elif args.headless or args.output:
+        print("Rendering headless...")
+        success = cloak.run_headless(args.output, args.background_frames)
     else:
         print("Starting invisibility cloak...")
         success = cloak.run_invisibility_cloak(show_debug=args.debug)
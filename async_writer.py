@@ -0,0 +1,164 @@
+"""
+Asynchronous Frame Writers for Invisibility Cloak
+Snapshot saving and continuous recording on background threads
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from metrics import Metrics
+from video_output import open_video_writer
+
+
+class BackgroundWriter:
+    """
+    Bounded queue of frames consumed by worker threads.
+
+    submit() copies the frame into a recycled buffer and queues it, so the
+    caller can reuse its own (pooled) frame immediately. When the queue is
+    full the policy decides: 'drop' discards the frame and counts it in
+    `<name>_dropped`, 'block' waits for a free slot, counts the stall in
+    `<name>_blocked` and records the wait as the `<name>_wait` stage.
+    cv2.imwrite and VideoWriter.write release the GIL, so encoding runs
+    in parallel with the frame loop.
+    """
+
+    POLICIES = ('drop', 'block')
+
+    def __init__(self, name, workers=1, queue_size=8, policy='drop', metrics=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"policy must be one of {self.POLICIES}")
+        if workers < 1 or queue_size < 1:
+            raise ValueError("workers and queue_size must be >= 1")
+
+        self.name = name
+        self.policy = policy
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+
+        self.frames_submitted = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.times_blocked = 0
+        self.errors = 0
+
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        # Frame copies handed back by the workers for reuse
+        self._free = deque()
+        self._threads = [threading.Thread(target=self._work, name=f"{name}-writer-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _copy(self, frame):
+        while self._free:
+            buffer = self._free.pop()
+            if buffer.shape == frame.shape and buffer.dtype == frame.dtype:
+                buffer[...] = frame
+                return buffer
+        return frame.copy()
+
+    def submit(self, frame, *args):
+        """Queue a copy of frame; returns False if it was dropped"""
+        # The frame loop is the only producer, so a queue seen with room keeps it
+        if self._queue.full():
+            if self.policy == 'drop':
+                self.frames_dropped += 1
+                self.metrics.increment(f"{self.name}_dropped")
+                return False
+
+            self.times_blocked += 1
+            self.metrics.increment(f"{self.name}_blocked")
+            start = time.perf_counter()
+            self._queue.put((self._copy(frame), args))
+            self.metrics.record(f"{self.name}_wait", time.perf_counter() - start)
+        else:
+            self._queue.put((self._copy(frame), args))
+
+        self.frames_submitted += 1
+        return True
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            frame, args = job
+            try:
+                self._write(frame, *args)
+                with self._lock:
+                    self.frames_written += 1
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"Warning: {self.name} write failed: {e}")
+            self._free.append(frame)
+
+    def _write(self, frame, *args):
+        raise NotImplementedError
+
+    def pending(self):
+        """Frames queued but not yet picked up by a worker"""
+        return self._queue.qsize()
+
+    def close(self):
+        """Finish every queued frame and stop the workers"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self):
+        return {
+            'submitted': self.frames_submitted,
+            'written': self.frames_written,
+            'dropped': self.frames_dropped,
+            'blocked': self.times_blocked,
+            'errors': self.errors,
+        }
+
+
+class SnapshotWriter(BackgroundWriter):
+    """Saves single frames as image files on a few worker threads"""
+
+    def __init__(self, workers=2, queue_size=8, policy='drop', metrics=None):
+        super().__init__('snapshots', workers, queue_size, policy, metrics)
+
+    def save(self, path, frame):
+        """Queue frame to be written to path; returns False if dropped"""
+        return self.submit(frame, path)
+
+    def _write(self, frame, path):
+        if not cv2.imwrite(path, frame):
+            raise Exception(f"Could not write {path}")
+
+
+class VideoRecorder(BackgroundWriter):
+    """
+    Encodes a continuous stream of frames into a video file.
+
+    A single worker keeps the frames in order. The default 'block' policy
+    never loses frames; 'drop' keeps the frame loop at full speed and
+    leaves gaps in the recording when the encoder falls behind.
+    """
+
+    def __init__(self, path, fps, frame_size, queue_size=32, policy='block', metrics=None):
+        self.path = path
+        # Open before starting the worker so a bad path fails immediately
+        self.writer = open_video_writer(path, fps, frame_size)
+        super().__init__('recording', 1, queue_size, policy, metrics)
+
+    def write(self, frame):
+        """Queue the next frame of the recording; returns False if dropped"""
+        return self.submit(frame)
+
+    def _write(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        super().close()
+        self.writer.release()
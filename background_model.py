@@ -0,0 +1,140 @@
+"""
+Background Model for Invisibility Cloak
+Temporal median / trimmed mean background with adaptive runtime updates
+"""
+
+import cv2
+import numpy as np
+
+
+class BackgroundModel:
+    """
+    Estimate the static background from several frames.
+
+    During capture, frames are kept in a fixed-size sample buffer. When it
+    fills up, every other sample is dropped and the sampling stride
+    doubles, so memory stays bounded while the kept samples still span
+    the whole capture. finalize() reduces them per pixel with a median or
+    a trimmed mean, which removes sensor noise and passers-by.
+
+    At runtime update() blends non-cloak pixels into the background with a
+    running average, so slow lighting changes are followed without a
+    blocking recapture.
+    """
+
+    METHODS = ('last', 'median', 'trimmed')
+
+    def __init__(self, method='median', max_samples=15, trim_fraction=0.2,
+                 learning_rate=0.02, update_interval=1):
+        if method not in self.METHODS:
+            raise ValueError(f"method must be one of {', '.join(self.METHODS)}")
+        if max_samples < 2:
+            raise ValueError("max_samples must be at least 2")
+
+        self.method = method
+        self.max_samples = max_samples
+        self.trim_fraction = trim_fraction
+        self.learning_rate = learning_rate
+        self.update_interval = max(1, update_interval)
+
+        self.background = None
+        self._samples = None
+        self._accumulator = None
+        self._inverse_mask = None
+        self.reset()
+
+    def reset(self):
+        """Start a new capture; the current background stays valid until finalize()"""
+        self.sample_count = 0
+        self.frames_seen = 0
+        self.stride = 1
+        self._last_frame = None
+        self._update_count = 0
+
+    def add(self, frame):
+        """Offer one capture frame to the model"""
+        self.frames_seen += 1
+        self._last_frame = frame
+
+        if self.method == 'last' or (self.frames_seen - 1) % self.stride:
+            return
+
+        if self._samples is None or self._samples.shape[1:] != frame.shape:
+            self._samples = np.empty((self.max_samples,) + frame.shape, np.uint8)
+
+        if self.sample_count == self.max_samples:
+            # Keep every other sample and halve the sampling rate from here on
+            kept = self._samples[::2].copy()
+            self._samples[:len(kept)] = kept
+            self.sample_count = len(kept)
+            self.stride *= 2
+            if (self.frames_seen - 1) % self.stride:
+                return
+
+        self._samples[self.sample_count] = frame
+        self.sample_count += 1
+
+    def finalize(self):
+        """Reduce the collected samples into the background image"""
+        if self._last_frame is None:
+            raise Exception("No frames were added to the background model")
+
+        if self.method == 'last' or self.sample_count < 2:
+            background = self._last_frame.copy()
+        else:
+            ordered = self._sort_samples()
+            if self.method == 'median':
+                background = ordered[self.sample_count // 2].copy()
+            else:
+                trim = min(int(self.sample_count * self.trim_fraction), (self.sample_count - 1) // 2)
+                kept = ordered[trim:self.sample_count - trim]
+                total = np.zeros(kept[0].shape, np.uint16)
+                for sample in kept:
+                    total += sample
+                background = ((total + len(kept) // 2) // len(kept)).astype(np.uint8)
+
+        # Update the existing array in place so references to it stay valid
+        if self.background is not None and self.background.shape == background.shape:
+            self.background[...] = background
+        else:
+            self.background = background
+        self._accumulator = self.background.astype(np.float32)
+        self._last_frame = None
+        return self.background
+
+    def _sort_samples(self):
+        """
+        Sort the samples per pixel along time.
+
+        Uses an odd-even transposition network of whole-frame min/max
+        passes: contiguous and SIMD friendly, unlike sorting along the
+        strided time axis. The sample buffer is scrambled afterwards.
+        """
+        count = self.sample_count
+        ordered = [self._samples[i] for i in range(count)]
+        spare = np.empty_like(ordered[0])
+
+        for round_index in range(count):
+            for i in range(round_index % 2, count - 1, 2):
+                np.minimum(ordered[i], ordered[i + 1], out=spare)
+                np.maximum(ordered[i], ordered[i + 1], out=ordered[i + 1])
+                ordered[i], spare = spare, ordered[i]
+
+        return ordered
+
+    def update(self, frame, mask):
+        """Blend pixels outside the cloak mask into the background"""
+        if self.background is None or self.learning_rate <= 0:
+            return self.background
+
+        self._update_count += 1
+        if self._update_count % self.update_interval:
+            return self.background
+
+        if self._inverse_mask is None or self._inverse_mask.shape != mask.shape:
+            self._inverse_mask = np.empty(mask.shape, np.uint8)
+        cv2.bitwise_not(mask, dst=self._inverse_mask)
+
+        cv2.accumulateWeighted(frame, self._accumulator, self.learning_rate, mask=self._inverse_mask)
+        cv2.convertScaleAbs(self._accumulator, dst=self.background)
+        return self.background
@@ -0,0 +1,302 @@
+"""
+Stage Benchmarks for Invisibility Cloak
+Times each pipeline stage on deterministic synthetic frames, compares
+against a stored baseline and checks outputs against golden digests
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from advanced_invisibility_cloak import InvisibilityCloak
+from color_detection_demo import ColorDetectionDemo
+from compositor import FeatherCompositor
+
+RESOLUTIONS = {
+    '480p': (640, 480),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+DEFAULT_GOLDEN = os.path.join(BENCHMARK_DIR, 'golden.json')
+
+
+def synthetic_scene(width, height, seed=0):
+    """
+    Deterministic (frame, background) pair.
+
+    The background is a smooth random texture; the frame is the same
+    texture with sensor-like noise, a red cloak blob and a blue object,
+    so both the red and the other color masks have something to find.
+    """
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (max(2, height // 24), max(2, width // 24), 3), dtype=np.uint8)
+    background = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+
+    noise = rng.integers(-6, 7, background.shape, dtype=np.int16)
+    frame = np.clip(background.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+    center = (width // 2, height // 2)
+    cv2.ellipse(frame, center, (width // 6, height // 3), 0, 0, 360, (25, 15, 190), -1)
+    cv2.circle(frame, (width // 5, height // 4), max(4, height // 12), (200, 60, 20), -1)
+    return frame, background
+
+
+def digest(array):
+    """Short content hash of an array, including its shape"""
+    hasher = hashlib.sha256()
+    hasher.update(str(array.shape).encode())
+    hasher.update(np.ascontiguousarray(array).tobytes())
+    return hasher.hexdigest()[:16]
+
+
+def time_stage(fn, iterations, warmup=2):
+    """Median wall time of fn in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def run_resolution(width, height, iterations):
+    """Benchmark every stage at one resolution; return (timings, digests)"""
+    frame, background = synthetic_scene(width, height)
+    cloak = InvisibilityCloak(width=width, height=height)
+    cloak.background = background
+    demo = ColorDetectionDemo()
+    feather = FeatherCompositor(radius=3)
+    kernel = cloak.kernel
+    lower1, upper1 = cloak.red_ranges[0]
+    lower2, upper2 = cloak.red_ranges[1]
+
+    # Intermediate results, computed once so each stage sees realistic input
+    flipped = cv2.flip(frame, 1)
+    hsv = cv2.cvtColor(flipped, cv2.COLOR_BGR2HSV)
+    mask1 = cv2.inRange(hsv, lower1, upper1)
+    mask2 = cv2.inRange(hsv, lower2, upper2)
+    combined = cv2.bitwise_or(mask1, mask2)
+    opened = cv2.morphologyEx(combined, cv2.MORPH_OPEN, kernel)
+    dilated = cv2.morphologyEx(opened, cv2.MORPH_DILATE, kernel, iterations=2)
+    mask = cv2.medianBlur(dilated, 5)
+    for color_name in demo.colors:
+        # Build the demo's lookup tables up front so no stage times the build
+        demo.create_color_mask_lut(flipped, color_name)
+
+    # The overlay lines of add_info_overlay, drawn with cv2.putText on every call
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    text_lines = (
+        ("Invisibility Cloak Active", (10, 30), font, 0.7, (0, 255, 0), 2),
+        ("Press 'q' to quit, 'r' to recapture background", (10, 60), font, 0.5, (255, 255, 255), 1),
+    )
+    canvas = flipped.copy()
+
+    def put_text(image):
+        for text, origin, face, scale, color, thickness in text_lines:
+            cv2.putText(image, text, origin, face, scale, color, thickness)
+        return image
+
+    def bitwise_composite():
+        mask_inv = cv2.bitwise_not(mask)
+        frame_no_cloak = cv2.bitwise_and(flipped, flipped, mask=mask_inv)
+        background_cloak = cv2.bitwise_and(background, background, mask=mask)
+        return cv2.add(frame_no_cloak, background_cloak)
+
+    stages = {
+        'flip': lambda: cv2.flip(frame, 1),
+        'cvtColor': lambda: cv2.cvtColor(flipped, cv2.COLOR_BGR2HSV),
+        'inRange': lambda: (cv2.inRange(hsv, lower1, upper1), cv2.inRange(hsv, lower2, upper2)),
+        'bitwise_or': lambda: cv2.bitwise_or(mask1, mask2),
+        'morph_open': lambda: cv2.morphologyEx(combined, cv2.MORPH_OPEN, kernel),
+        'morph_dilate': lambda: cv2.morphologyEx(opened, cv2.MORPH_DILATE, kernel, iterations=2),
+        'medianBlur': lambda: cv2.medianBlur(dilated, 5),
+        'refine_separable': lambda: cloak.refine_mask_separable(combined),
+        'composite_bitwise': bitwise_composite,
+        'composite': lambda: cloak.apply_invisibility_effect(flipped, mask),
+        'composite_feather': lambda: feather.composite(flipped, background, mask),
+        'putText': lambda: put_text(canvas),
+        'overlay_sprite': lambda: cloak.add_info_overlay(canvas),
+        'create_red_mask': lambda: cloak.create_red_mask(hsv),
+    }
+    for color_name in demo.colors:
+        stages[f'color_mask_{color_name}'] = lambda name=color_name: demo.create_color_mask(hsv, name)
+        stages[f'color_mask_lut_{color_name}'] = lambda name=color_name: demo.create_color_mask_lut(flipped, name)
+    stages['color_labels_all'] = lambda: demo.labeler.classify(hsv)
+
+    timings = {name: time_stage(fn, iterations) for name, fn in stages.items()}
+
+    digests = {
+        'mask': digest(mask),
+        'refine_separable': digest(cloak.refine_mask_separable(combined)),
+        'create_red_mask': digest(cloak.create_red_mask(hsv)),
+        'composite': digest(cloak.apply_invisibility_effect(flipped, mask)),
+        'composite_bitwise': digest(bitwise_composite()),
+        'composite_feather': digest(feather.composite(flipped, background, mask)),
+        'putText': digest(put_text(flipped.copy())),
+        'overlay': digest(cloak.add_info_overlay(flipped.copy())),
+    }
+    for color_name in demo.colors:
+        digests[f'color_mask_{color_name}'] = digest(demo.create_color_mask(hsv, color_name))
+        digests[f'color_mask_lut_{color_name}'] = digest(demo.create_color_mask_lut(flipped, color_name))
+    digests['color_labels_all'] = digest(demo.labeler.classify(hsv))
+
+    return timings, digests
+
+
+def compare_to_baseline(results, baseline, tolerance, min_delta_ms):
+    """Return a list of (resolution, stage, baseline ms, current ms) regressions"""
+    regressions = []
+    for resolution, timings in results.items():
+        reference = baseline.get(resolution, {})
+        for stage, current in timings.items():
+            previous = reference.get(stage)
+            if previous is None:
+                continue
+            # Ignore sub-noise differences on very fast stages
+            if current > previous * (1 + tolerance) and current - previous > min_delta_ms:
+                regressions.append((resolution, stage, previous, current))
+    return regressions
+
+
+def compare_to_golden(digests, golden):
+    """
+    Return (mismatches, unchecked): (resolution, output) pairs whose digest
+    changed, and pairs with no golden digest to compare against.
+    """
+    mismatches = []
+    unchecked = []
+    for resolution, outputs in digests.items():
+        for name, value in outputs.items():
+            expected = golden.get(resolution, {}).get(name)
+            if expected is None:
+                unchecked.append((resolution, name))
+            elif expected != value:
+                mismatches.append((resolution, name))
+    return mismatches, unchecked
+
+
+def load_json(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+
+def save_json(path, data):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-stage benchmarks for the invisibility cloak pipeline')
+    parser.add_argument('--resolutions', nargs='+', choices=list(RESOLUTIONS), default=list(RESOLUTIONS),
+                        help='Resolutions to benchmark (default: all)')
+    parser.add_argument('--iterations', type=int, default=30, help='Timed iterations per stage (default: 30)')
+    parser.add_argument('--output', type=str, default=None, help='Write results JSON to this path')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help='Baseline timings JSON')
+    parser.add_argument('--golden', type=str, default=DEFAULT_GOLDEN, help='Golden output digests JSON')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed slowdown before failing (default: 0.15 = 15%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05, help='Ignore slowdowns smaller than this (default: 0.05)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these timings as the new baseline')
+    parser.add_argument('--update-golden', action='store_true', help='Store these outputs as the new golden digests')
+    parser.add_argument('--strict', action='store_true',
+                        help='Fail when a check is skipped (no baseline, or no golden digests for this OpenCV)')
+    args = parser.parse_args()
+
+    cv2.setRNGSeed(0)
+    results = {}
+    digests = {}
+    for resolution in args.resolutions:
+        width, height = RESOLUTIONS[resolution]
+        print(f"Benchmarking {resolution} ({width}x{height})...")
+        results[resolution], digests[resolution] = run_resolution(width, height, args.iterations)
+        for stage, ms in results[resolution].items():
+            print(f"  {stage:<22}{ms:>9.3f} ms")
+
+    report = {
+        'meta': {
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cv2_threads': cv2.getNumThreads(),
+            'iterations': args.iterations,
+        },
+        'timings_ms': results,
+        'digests': digests,
+    }
+    if args.output:
+        save_json(args.output, report)
+        print(f"Results written to {args.output}")
+
+    failed = False
+    skipped = []
+
+    # Digests are only reproducible with the OpenCV build they were recorded
+    # with, so golden.json keeps one set per OpenCV version
+    golden = load_json(args.golden) or {}
+    if args.update_golden:
+        golden.setdefault(cv2.__version__, {}).update(digests)
+        save_json(args.golden, golden)
+        print(f"Golden digests for OpenCV {cv2.__version__} updated in {args.golden}")
+    elif cv2.__version__ not in golden:
+        recorded = ', '.join(sorted(golden)) or 'none'
+        skipped.append(f"outputs not checked: {args.golden} has no digests for OpenCV {cv2.__version__} "
+                       f"(recorded: {recorded}); run with --update-golden on a known-good tree")
+    else:
+        mismatches, unchecked = compare_to_golden(digests, golden[cv2.__version__])
+        for resolution, name in mismatches:
+            print(f"GOLDEN MISMATCH: {resolution} {name}")
+        failed = failed or bool(mismatches)
+        if unchecked:
+            names = ', '.join(f"{resolution} {name}" for resolution, name in unchecked)
+            skipped.append(f"{len(unchecked)} outputs have no golden digest: {names}")
+
+    baseline = load_json(args.baseline)
+    if args.save_baseline:
+        merged = baseline or {}
+        merged.update(results)
+        save_json(args.baseline, merged)
+        print(f"Baseline updated in {args.baseline}")
+    elif not baseline:
+        skipped.append(f"timings not compared: no baseline at {args.baseline}; "
+                       f"record one on this machine with --save-baseline")
+    else:
+        regressions = compare_to_baseline(results, baseline, args.tolerance, args.min_delta_ms)
+        for resolution, stage, previous, current in regressions:
+            print(f"REGRESSION: {resolution} {stage} {previous:.3f} ms -> {current:.3f} ms")
+        failed = failed or bool(regressions)
+        missing = [resolution for resolution in results if resolution not in baseline]
+        if missing:
+            skipped.append(f"timings not compared for {', '.join(missing)}: not in {args.baseline}")
+
+    for reason in skipped:
+        print(f"WARNING: {reason}")
+
+    if failed or (skipped and args.strict):
+        sys.exit(1)
+    if skipped:
+        print(f"No failures, but {len(skipped)} checks were skipped (see warnings above)")
+    else:
+        print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
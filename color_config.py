@@ -0,0 +1,48 @@
+"""
+Color Config for Invisibility Cloak
+Reads and writes HSV color ranges as JSON
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+def load_color_config(path):
+    """
+    Read a color config into the ColorDetectionDemo.colors layout.
+
+    The file looks like {"colors": {"red": {"ranges": [[[0, 120, 70],
+    [10, 255, 255]], ...], "color": [0, 0, 255]}}}; ranges become
+    (lower, upper) numpy array pairs ready for cv2.inRange.
+    """
+    with open(path) as f:
+        data = json.load(f)
+
+    colors = {}
+    for name, entry in data.get('colors', {}).items():
+        ranges = [(np.array(lower), np.array(upper)) for lower, upper in entry['ranges']]
+        if not ranges:
+            raise ValueError(f"Color {name!r} in {path} has no ranges")
+        colors[name] = {'ranges': ranges, 'color': tuple(entry.get('color', (255, 255, 255)))}
+    return colors
+
+
+def save_color_config(path, colors):
+    """Write colors into the config at path, keeping any other colors already there"""
+    data = {'colors': {}}
+    if os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+        data.setdefault('colors', {})
+
+    for name, entry in colors.items():
+        data['colors'][name] = {
+            'ranges': [[np.asarray(lower).tolist(), np.asarray(upper).tolist()] for lower, upper in entry['ranges']],
+            'color': list(entry.get('color', (255, 255, 255))),
+        }
+
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
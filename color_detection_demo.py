@@ -3,13 +3,21 @@ Color Detection Demo for Invisibility Cloak
 Demonstrates different color detection options
 """
 
+import argparse
 import cv2
 import numpy as np
 import time
 
+from color_config import load_color_config
+from color_labels import ColorLabeler
+from color_lut import ColorLUT
+from overlay_cache import OverlayCache
+
 class ColorDetectionDemo:
-    def __init__(self):
+    def __init__(self, use_lut=False, color_config=None):
         self.cap = None
+        self.use_lut = use_lut
+        self.luts = {}
         self.colors = {
             'red': {
                 'ranges': [
@@ -43,7 +51,21 @@ class ColorDetectionDemo:
                 'color': (128, 0, 128)
             }
         }
+        # Tuned ranges (see hsv_tuner.py) replace or extend the defaults
+        if color_config:
+            self.colors.update(load_color_config(color_config))
         self.current_color = 'red'
+        # Labels every color above in one pass ('all' mode), built on first use
+        self._labeler = None
+        # Text sprites, re-rendered only when the selected color changes
+        self.overlay_cache = OverlayCache()
+        
+    @property
+    def labeler(self):
+        """Single-pass labeler over every color; raises ValueError if they have too many ranges"""
+        if self._labeler is None:
+            self._labeler = ColorLabeler(self.colors)
+        return self._labeler
         
     def initialize_camera(self):
         """Initialize camera"""
@@ -72,7 +94,17 @@ class ColorDetectionDemo:
             for mask in masks[1:]:
                 combined_mask = cv2.bitwise_or(combined_mask, mask)
         
-        # Clean up mask
+        return self.clean_mask(combined_mask)
+    
+    def create_color_mask_lut(self, frame, color_name):
+        """Create mask for specified color from BGR using a cached lookup table"""
+        if color_name not in self.luts:
+            self.luts[color_name] = ColorLUT.for_color(self.colors[color_name])
+        
+        return self.clean_mask(self.luts[color_name].apply(frame))
+    
+    def clean_mask(self, combined_mask):
+        """Remove noise and fill holes in a raw color mask"""
         kernel = np.ones((3, 3), np.uint8)
         combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_OPEN, kernel)
         combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_DILATE, kernel, iterations=2)
@@ -92,6 +124,23 @@ class ColorDetectionDemo:
         
         return result
     
+    def add_multi_color_overlay(self, frame, color_bits):
+        """Add each color's overlay to its detected regions in one blend"""
+        label_map = self.labeler.label_map(color_bits)
+        
+        # Palette indexed by label: 0 = no color, i + 1 = self.labeler.names[i]
+        palette = np.zeros((len(self.labeler.names) + 1, 3), np.uint8)
+        for index, name in enumerate(self.labeler.names):
+            palette[index + 1] = self.colors[name]['color']
+        overlay = palette[label_map]
+        
+        # Blend everywhere, then keep the blend only where a color was found
+        blended = cv2.addWeighted(frame, 0.7, overlay, 0.3, 0)
+        result = frame.copy()
+        cv2.copyTo(blended, label_map, result)
+        
+        return result
+    
     def run_demo(self):
         """Run the color detection demo"""
         if not self.initialize_camera():
@@ -105,6 +154,7 @@ class ColorDetectionDemo:
         print("  '3' - Green detection")
         print("  '4' - Yellow detection")
         print("  '5' - Purple detection")
+        print("  'a' - All colors at once")
         print("  'q' - Quit")
         
         try:
@@ -114,28 +164,47 @@ class ColorDetectionDemo:
                     break
                 
                 frame = cv2.flip(frame, 1)
-                hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
                 
                 # Create mask for current color
-                mask = self.create_color_mask(hsv, self.current_color)
-                
-                # Add overlay
-                result = self.add_color_overlay(frame, mask, self.current_color)
+                if self.current_color == 'all':
+                    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+                    color_bits = self.labeler.classify(hsv)
+                    mask = self.clean_mask(self.labeler.mask(color_bits, self.labeler.names))
+                    result = self.add_multi_color_overlay(frame, color_bits)
+                else:
+                    if self.use_lut:
+                        mask = self.create_color_mask_lut(frame, self.current_color)
+                    else:
+                        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+                        mask = self.create_color_mask(hsv, self.current_color)
+                    
+                    # Add overlay
+                    result = self.add_color_overlay(frame, mask, self.current_color)
                 
                 # Add text information
                 font = cv2.FONT_HERSHEY_SIMPLEX
-                cv2.putText(result, f"Detecting: {self.current_color.upper()}", 
-                           (10, 30), font, 1, (255, 255, 255), 2)
-                cv2.putText(result, "Press 1-5 to change color, 'q' to quit", 
-                           (10, 60), font, 0.6, (255, 255, 255), 1)
+                lines = [
+                    (f"Detecting: {self.current_color.upper()}", (10, 30), font, 1, (255, 255, 255), 2),
+                    ("Press 1-5 to change color, 'a' for all, 'q' to quit", (10, 60), font, 0.6, (255, 255, 255), 1),
+                ]
                 
-                # Show HSV ranges
-                color_info = self.colors[self.current_color]
                 y_pos = 90
-                for i, (lower, upper) in enumerate(color_info['ranges']):
-                    range_text = f"Range {i+1}: H({lower[0]}-{upper[0]}) S({lower[1]}-{upper[1]}) V({lower[2]}-{upper[2]})"
-                    cv2.putText(result, range_text, (10, y_pos), font, 0.4, (200, 200, 200), 1)
-                    y_pos += 20
+                if self.current_color == 'all':
+                    # Coverage changes every frame, so it is drawn directly
+                    total = color_bits.size
+                    for name, count in self.labeler.pixel_counts(color_bits).items():
+                        coverage_text = f"{name}: {100.0 * count / total:.1f}%"
+                        cv2.putText(result, coverage_text, (10, y_pos), font, 0.4, self.colors[name]['color'], 1)
+                        y_pos += 20
+                else:
+                    # Show HSV ranges
+                    color_info = self.colors[self.current_color]
+                    for i, (lower, upper) in enumerate(color_info['ranges']):
+                        range_text = f"Range {i+1}: H({lower[0]}-{upper[0]}) S({lower[1]}-{upper[1]}) V({lower[2]}-{upper[2]})"
+                        lines.append((range_text, (10, y_pos), font, 0.4, (200, 200, 200), 1))
+                        y_pos += 20
+                
+                self.overlay_cache.draw(result, 'info', lines)
                 
                 # Display windows
                 cv2.imshow('Color Detection Demo', result)
@@ -161,6 +230,14 @@ class ColorDetectionDemo:
                 elif key == ord('5'):
                     self.current_color = 'purple'
                     print("Switched to PURPLE detection")
+                elif key == ord('a'):
+                    try:
+                        self.labeler
+                    except ValueError as e:
+                        print(f"Cannot label all colors at once: {e}")
+                    else:
+                        self.current_color = 'all'
+                        print("Switched to ALL colors detection")
         
         finally:
             self.cap.release()
@@ -233,6 +310,13 @@ def hsv_color_picker():
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description='Color detection tools for the invisibility cloak')
+    parser.add_argument('--color-config', type=str, default=None,
+                        help='JSON color ranges written by hsv_tuner.py, merged into the demo palette')
+    parser.add_argument('--lut', action='store_true',
+                        help='Detect single colors with a precomputed BGR lookup table instead of HSV conversion')
+    args = parser.parse_args()
+    
     print("=== Color Detection Tools ===")
     print("1. Color Detection Demo")
     print("2. HSV Color Picker")
@@ -240,7 +324,7 @@ def main():
     choice = input("Enter your choice (1 or 2): ").strip()
     
     if choice == "1":
-        demo = ColorDetectionDemo()
+        demo = ColorDetectionDemo(use_lut=args.lut, color_config=args.color_config)
         demo.run_demo()
     elif choice == "2":
         hsv_color_picker()
@@ -0,0 +1,123 @@
+"""
+Color Labelling for Invisibility Cloak
+Classifies every configured color in one pass over the HSV frame
+"""
+
+import copy
+
+import cv2
+import numpy as np
+
+
+class ColorLabeler:
+    """
+    Label all colors of a ColorDetectionDemo-style table at once.
+
+    Each HSV range gets one bit. Three 256-entry tables (one per H, S and
+    V channel) hold, for every channel value, the bits of the ranges that
+    value falls inside; ANDing the three looked-up planes gives, per pixel,
+    exactly the ranges cv2.inRange would accept. A final table folds range
+    bits into color bits. The whole classification is a split, three
+    LUTs, two ANDs and one more LUT regardless of the number of colors.
+
+    classify() returns a "color bits" map (bit i set = color i matched,
+    colors may overlap). Masks and a first-match label map are derived
+    from it on request with one cv2.LUT each.
+    """
+
+    MAX_RANGES = 8
+
+    def __init__(self, colors):
+        self.names = list(colors)
+        self.colors = colors
+
+        ranges = [(index, lower, upper)
+                  for index, name in enumerate(self.names)
+                  for lower, upper in colors[name]['ranges']]
+        if len(ranges) > self.MAX_RANGES:
+            raise ValueError(f"{self.names} use {len(ranges)} HSV ranges; at most {self.MAX_RANGES} "
+                             f"can be labelled in one pass")
+
+        # Per channel: value -> bits of the ranges containing that value
+        self.channel_luts = [np.zeros(256, np.uint8) for _ in range(3)]
+        range_owner = np.zeros(self.MAX_RANGES, np.uint8)
+        for bit, (owner, lower, upper) in enumerate(ranges):
+            range_owner[bit] = 1 << owner
+            for channel in range(3):
+                low = max(0, int(lower[channel]))
+                high = min(255, int(upper[channel]))
+                if low <= high:
+                    self.channel_luts[channel][low:high + 1] |= 1 << bit
+
+        # Range bits -> color bits
+        values = np.arange(256)
+        self.color_bits_lut = np.zeros(256, np.uint8)
+        for bit in range(len(ranges)):
+            self.color_bits_lut[(values >> bit) & 1 == 1] |= range_owner[bit]
+
+        # Color bits -> 1-based index of the first matching color (0 = none)
+        self.label_lut = np.zeros(256, np.uint8)
+        for index in reversed(range(len(self.names))):
+            self.label_lut[(values >> index) & 1 == 1] = index + 1
+
+        self._mask_luts = {}
+        self._planes = None
+        self._scratch = None
+
+    def thread_copy(self):
+        """Copy that shares the lookup tables but has its own scratch buffers, for another thread"""
+        clone = copy.copy(self)
+        clone._mask_luts = dict(self._mask_luts)
+        clone._planes = clone._scratch = None
+        return clone
+
+    def _buffers(self, shape):
+        if self._scratch is None or self._scratch[0].shape != shape:
+            self._planes = [np.empty(shape, np.uint8) for _ in range(3)]
+            self._scratch = [np.empty(shape, np.uint8) for _ in range(2)]
+        return self._planes, self._scratch
+
+    def classify(self, hsv_frame, dst=None):
+        """Return the color bits map for an HSV frame"""
+        planes, (looked_up, bits) = self._buffers(hsv_frame.shape[:2])
+        cv2.split(hsv_frame, planes)
+
+        cv2.LUT(planes[0], self.channel_luts[0], dst=bits)
+        for channel in (1, 2):
+            cv2.LUT(planes[channel], self.channel_luts[channel], dst=looked_up)
+            cv2.bitwise_and(bits, looked_up, dst=bits)
+
+        return cv2.LUT(bits, self.color_bits_lut, dst=dst)
+
+    def classify_bgr(self, frame, dst=None):
+        """Convert a BGR frame to HSV and classify it"""
+        return self.classify(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV), dst)
+
+    def label_map(self, color_bits, dst=None):
+        """First-match label per pixel: 0 for none, i + 1 for self.names[i]"""
+        return cv2.LUT(color_bits, self.label_lut, dst=dst)
+
+    def _mask_lut(self, names):
+        key = tuple(names)
+        lut = self._mask_luts.get(key)
+        if lut is None:
+            wanted = 0
+            for name in names:
+                wanted |= 1 << self.names.index(name)
+            lut = np.where(np.arange(256) & wanted, 255, 0).astype(np.uint8)
+            self._mask_luts[key] = lut
+        return lut
+
+    def mask(self, color_bits, names, dst=None):
+        """0/255 mask of pixels matching any of the given colors"""
+        if isinstance(names, str):
+            names = (names,)
+        return cv2.LUT(color_bits, self._mask_lut(names), dst=dst)
+
+    def pixel_counts(self, color_bits):
+        """Number of pixels matching each color (overlaps count for both)"""
+        histogram = cv2.calcHist([color_bits], [0], None, [256], [0, 256]).ravel()
+        counts = {}
+        for index, name in enumerate(self.names):
+            counts[name] = int(histogram[(np.arange(256) >> index) & 1 == 1].sum())
+        return counts
@@ -0,0 +1,212 @@
+"""
+Color Lookup Table for Invisibility Cloak
+Precomputed BGR -> mask table replacing cvtColor + inRange
+"""
+
+import argparse
+import copy
+import hashlib
+import os
+import time
+
+import cv2
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'gitcloak')
+
+
+class ColorLUT:
+    """
+    Lookup table mapping every BGR color to 0 or 255.
+
+    With bits=8 the table has one entry per 24-bit color (16 MB) and is
+    bit-exact with cv2.cvtColor(BGR2HSV) followed by cv2.inRange over the
+    same ranges. Lower bit depths quantize each channel (e.g. bits=6 gives
+    a 256 KB table that stays in cache) and evaluate the cell center.
+    """
+
+    def __init__(self, ranges, bits=8, cache_dir=DEFAULT_CACHE_DIR):
+        if not 1 <= bits <= 8:
+            raise ValueError("bits must be between 1 and 8")
+
+        self.ranges = [(np.asarray(lower), np.asarray(upper)) for lower, upper in ranges]
+        self.bits = bits
+        self.shift = 8 - bits
+        self.cache_dir = cache_dir
+
+        self._index = None
+        self._scratch = None
+        self._bgra = None
+        self.table = self._load_or_build()
+
+    @classmethod
+    def for_color(cls, color_info, **kwargs):
+        """Build a table for an entry of ColorDetectionDemo.colors"""
+        return cls(color_info['ranges'], **kwargs)
+
+    def cache_key(self):
+        """Hash of everything the table contents depend on"""
+        digest = hashlib.sha1()
+        digest.update(cv2.__version__.encode())
+        digest.update(bytes([self.bits]))
+        for lower, upper in self.ranges:
+            digest.update(np.asarray(lower, np.int32).tobytes())
+            digest.update(np.asarray(upper, np.int32).tobytes())
+        return digest.hexdigest()[:16]
+
+    def cache_path(self):
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f"lut_{self.bits}bit_{self.cache_key()}.npy")
+
+    def _load_or_build(self):
+        path = self.cache_path()
+        size = 1 << (3 * self.bits)
+
+        if path and os.path.exists(path):
+            try:
+                table = np.load(path)
+                if table.shape == (size,) and table.dtype == np.uint8:
+                    return table
+            except (OSError, ValueError):
+                pass
+
+        table = self.build()
+
+        if path:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                # Write then rename so a concurrent reader never sees half a file
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, table)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Warning: could not cache color table: {e}")
+
+        return table
+
+    def build(self):
+        """Evaluate the HSV ranges for every (quantized) BGR color"""
+        levels = 1 << self.bits
+        # Representative value of each quantization cell (exact for 8 bits)
+        values = (np.arange(levels, dtype=np.uint16) << self.shift) + ((1 << self.shift) >> 1)
+        values = values.astype(np.uint8)
+
+        # Index layout is r << 2*bits | g << bits | b, so b varies fastest;
+        # for 8 bits this is a little-endian BGRA pixel with alpha masked off
+        r, g, b = np.meshgrid(values, values, values, indexing='ij')
+        colors = np.stack([b.ravel(), g.ravel(), r.ravel()], axis=1).reshape(levels * levels, levels, 3)
+
+        hsv = cv2.cvtColor(colors, cv2.COLOR_BGR2HSV)
+        table = np.zeros(hsv.shape[:2], np.uint8)
+        for lower, upper in self.ranges:
+            cv2.bitwise_or(table, cv2.inRange(hsv, lower, upper), dst=table)
+
+        return table.ravel()
+
+    def thread_copy(self):
+        """Copy that shares the table but has its own scratch buffers, for another thread"""
+        clone = copy.copy(self)
+        clone._index = clone._scratch = clone._bgra = None
+        return clone
+
+    def _buffers(self, shape):
+        if self._index is None or self._index.shape != shape:
+            # Native index type: np.take converts any other index dtype to
+            # intp with a full-frame temporary on every call
+            self._index = np.empty(shape, np.intp)
+            self._scratch = np.empty(shape, np.intp)
+            self._bgra = np.empty(shape + (4,), np.uint8)
+        return self._index, self._scratch
+
+    def apply(self, frame, dst=None):
+        """Map a BGR frame straight to a 0/255 mask with a single gather"""
+        index, scratch = self._buffers(frame.shape[:2])
+        bits = self.bits
+        shift = self.shift
+
+        if bits == 8 and np.little_endian:
+            # Pad to BGRA and reinterpret each pixel as one 32-bit index
+            cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA, dst=self._bgra)
+            np.bitwise_and(self._bgra.view(np.uint32)[..., 0], 0x00FFFFFF, out=index)
+        else:
+            # index = (r >> shift) << 2*bits | (g >> shift) << bits | (b >> shift)
+            np.right_shift(frame[..., 2], shift, out=index, dtype=np.intp)
+            np.left_shift(index, 2 * bits, out=index)
+            np.right_shift(frame[..., 1], shift, out=scratch, dtype=np.intp)
+            np.left_shift(scratch, bits, out=scratch)
+            np.bitwise_or(index, scratch, out=index)
+            np.right_shift(frame[..., 0], shift, out=scratch, dtype=np.intp)
+            np.bitwise_or(index, scratch, out=index)
+
+        if dst is None:
+            dst = np.empty(frame.shape[:2], np.uint8)
+        # Every index is in range by construction; mode='clip' skips the bounds
+        # check, which would otherwise gather into a buffered copy of dst
+        np.take(self.table, index, out=dst, mode='clip')
+        return dst
+
+
+def threshold_hsv(frame, ranges):
+    """Reference path: cvtColor to HSV, one inRange per range, OR together"""
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, ranges[0][0], ranges[0][1])
+    for lower, upper in ranges[1:]:
+        mask = cv2.bitwise_or(mask, cv2.inRange(hsv, lower, upper))
+    return mask
+
+
+def synthetic_frame(width, height, seed=0):
+    """Smooth random color field with a saturated red patch"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+    frame = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    cv2.rectangle(frame, (width // 4, height // 4), (width // 2, 3 * height // 4), (30, 20, 200), -1)
+    return frame
+
+
+def benchmark(width=640, height=480, bits_options=(8, 6, 5), iterations=50):
+    """Compare cvtColor + inRange against table lookups on a synthetic frame"""
+    red_ranges = [
+        (np.array([0, 120, 70]), np.array([10, 255, 255])),
+        (np.array([170, 120, 70]), np.array([180, 255, 255]))
+    ]
+    frame = synthetic_frame(width, height)
+    reference = threshold_hsv(frame, red_ranges)
+
+    def time_it(fn):
+        fn()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return (time.perf_counter() - start) / iterations * 1000
+
+    print(f"Frame: {width}x{height}, {iterations} iterations")
+    print(f"{'path':<22}{'ms/frame':>10}{'agreement':>12}{'build ms':>10}")
+    print(f"{'cvtColor + inRange':<22}{time_it(lambda: threshold_hsv(frame, red_ranges)):>10.3f}{'100.00%':>12}{'-':>10}")
+
+    for bits in bits_options:
+        start = time.perf_counter()
+        lut = ColorLUT(red_ranges, bits=bits, cache_dir=None)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        dst = np.empty(frame.shape[:2], np.uint8)
+        ms = time_it(lambda: lut.apply(frame, dst))
+        agreement = np.mean(lut.apply(frame) == reference) * 100
+        print(f"{f'LUT {bits}-bit':<22}{ms:>10.3f}{agreement:>11.2f}%{build_ms:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the BGR lookup table against cvtColor + inRange')
+    parser.add_argument('--width', type=int, default=640, help='Frame width (default: 640)')
+    parser.add_argument('--height', type=int, default=480, help='Frame height (default: 480)')
+    parser.add_argument('--iterations', type=int, default=50, help='Timed iterations per path (default: 50)')
+    parser.add_argument('--bits', type=int, nargs='+', default=[8, 6, 5], help='Table bit depths to test')
+    args = parser.parse_args()
+
+    benchmark(args.width, args.height, tuple(args.bits), args.iterations)
+
+
+if __name__ == "__main__":
+    main()
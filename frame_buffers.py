@@ -0,0 +1,67 @@
+"""
+Frame Buffer Pool for Invisibility Cloak
+Preallocated, reusable arrays so the steady-state frame loop does not allocate
+"""
+
+import numpy as np
+
+
+class FramePool:
+    """
+    Named scratch buffers sized once for a given frame resolution.
+
+    get() hands out the same array every time it is asked for the same
+    name. Requests for a smaller shape return a top-left view into the
+    existing buffer, so stages working on sub-regions reuse the memory
+    too; a buffer is only reallocated if it has to grow.
+    """
+
+    # Buffers every pipeline run needs: (name, channels)
+    STANDARD_BUFFERS = (
+        ('capture', 3),
+        ('frame', 3),
+        ('hsv', 3),
+        ('output', 3),
+        ('mask_raw', 1),
+        ('mask_low', 1),
+        ('mask_open', 1),
+        ('mask_dilate', 1),
+        ('mask', 1),
+    )
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.allocations = 0
+        self._buffers = {}
+
+        for name, channels in self.STANDARD_BUFFERS:
+            self.get(name, self.shape(channels))
+
+    def shape(self, channels=3):
+        """Full-frame shape with the given channel count"""
+        if channels == 1:
+            return (self.height, self.width)
+        return (self.height, self.width, channels)
+
+    def get(self, name, shape=None, dtype=np.uint8):
+        """Return the buffer registered under name, allocating on first use"""
+        if shape is None:
+            shape = self._buffers[name].shape
+        shape = tuple(shape)
+
+        buffer = self._buffers.get(name)
+        if (buffer is None or buffer.dtype != np.dtype(dtype) or buffer.ndim != len(shape)
+                or buffer.shape[2:] != shape[2:]
+                or buffer.shape[0] < shape[0] or buffer.shape[1] < shape[1]):
+            buffer = np.empty(shape, dtype)
+            self._buffers[name] = buffer
+            self.allocations += 1
+
+        if buffer.shape == shape:
+            return buffer
+        return buffer[:shape[0], :shape[1]]
+
+    def nbytes(self):
+        """Total memory held by the pool"""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
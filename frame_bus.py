@@ -0,0 +1,238 @@
+"""
+Shared-Memory Frame Bus for Invisibility Cloak
+Publishes output frames and masks to other processes without copies or pickling
+"""
+
+import argparse
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAGIC = 0x434C4F414B425553  # "CLOAKBUS"
+
+# Header fields (int64)
+_MAGIC, _SLOTS, _HEIGHT, _WIDTH, _CHANNELS, _SEQUENCE, _CLOSED = range(7)
+HEADER_FIELDS = 8
+
+# Per-slot fields (int64): sequence at write start, at write end, timestamp in ns
+_BEGIN, _END, _TIME = range(3)
+SLOT_FIELDS = 4
+
+ALIGN = 64
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def _layout(buffer, slots, height, width, channels):
+    """Map the block as (header, slot table, frames, masks)"""
+    header = np.ndarray((HEADER_FIELDS,), np.int64, buffer=buffer)
+    offset = _aligned(header.nbytes)
+    table = np.ndarray((slots, SLOT_FIELDS), np.int64, buffer=buffer, offset=offset)
+    offset = _aligned(offset + table.nbytes)
+    frames = np.ndarray((slots, height, width, channels), np.uint8, buffer=buffer, offset=offset)
+    offset = _aligned(offset + frames.nbytes)
+    masks = np.ndarray((slots, height, width), np.uint8, buffer=buffer, offset=offset)
+    return header, table, frames, masks
+
+
+def _size(slots, height, width, channels):
+    size = _aligned(HEADER_FIELDS * 8) + _aligned(slots * SLOT_FIELDS * 8)
+    return size + _aligned(slots * height * width * channels) + slots * height * width
+
+
+class FrameBus:
+    """
+    Publisher side: a ring of `slots` frame + mask pairs in shared memory.
+
+    Every publish() copies the output frame and mask into the next slot
+    and stamps it with a sequence number, so other processes can map
+    the same memory and read frames as NumPy views. Each slot's sequence
+    is written before the copy (begin) and again after it (end). A
+    reader that sees begin == end == its sequence has a complete frame,
+    and the frame stays valid until the writer comes around the ring to
+    that slot again, `slots - 1` frames later.
+    """
+
+    def __init__(self, name, frame_shape, slots=8):
+        if slots < 2:
+            raise ValueError("slots must be >= 2")
+        height, width = frame_shape[:2]
+        channels = frame_shape[2] if len(frame_shape) == 3 else 1
+
+        self.name = name
+        self.slots = slots
+        self.frames_published = 0
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=_size(slots, height, width, channels))
+        self.header, self.table, self.frames, self.masks = _layout(self.shm.buf, slots, height, width, channels)
+
+        self.table[...] = -1
+        self.header[...] = 0
+        self.header[_SLOTS] = slots
+        self.header[_HEIGHT] = height
+        self.header[_WIDTH] = width
+        self.header[_CHANNELS] = channels
+        # Written last: readers that see the magic see a complete header
+        self.header[_MAGIC] = MAGIC
+
+    def publish(self, frame, mask=None):
+        """Copy frame (and mask) into the next slot; returns its sequence number"""
+        sequence = int(self.header[_SEQUENCE]) + 1
+        slot = sequence % self.slots
+        entry = self.table[slot]
+
+        entry[_BEGIN] = sequence
+        np.copyto(self.frames[slot], frame.reshape(self.frames.shape[1:]))
+        if mask is not None:
+            np.copyto(self.masks[slot], mask)
+        else:
+            self.masks[slot] = 0
+        entry[_TIME] = time.time_ns()
+        entry[_END] = sequence
+        self.header[_SEQUENCE] = sequence
+
+        self.frames_published += 1
+        return sequence
+
+    def close(self):
+        """Tell readers the stream ended and remove the shared block"""
+        self.header[_CLOSED] = 1
+        # Drop our views before the buffer goes away
+        self.header = self.table = self.frames = self.masks = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class FrameBusReader:
+    """
+    Consumer side: maps a FrameBus by name, read only by convention.
+
+    read(sequence) returns (timestamp_ns, frame, mask) views straight
+    into the shared block, or None once that frame has been overwritten.
+    Views are not copies, so check valid(sequence) after using one. If
+    it returns False, the writer began overwriting the slot in the
+    meantime and the result should be discarded (or copy the frame
+    first if it has to outlive the ring).
+    """
+
+    def __init__(self, name):
+        self.shm = shared_memory.SharedMemory(name=name)
+        # Before Python 3.13 attaching also registers the block for cleanup, and
+        # the tracker would unlink it from under the publisher when we exit
+        try:
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        except Exception:
+            pass
+
+        header = np.ndarray((HEADER_FIELDS,), np.int64, buffer=self.shm.buf)
+        if header[_MAGIC] != MAGIC:
+            self.shm.close()
+            raise Exception(f"{name!r} is not a frame bus")
+        self.slots = int(header[_SLOTS])
+        self.frame_shape = (int(header[_HEIGHT]), int(header[_WIDTH]), int(header[_CHANNELS]))
+        del header
+        self.header, self.table, self.frames, self.masks = _layout(self.shm.buf, self.slots, *self.frame_shape)
+
+    @property
+    def sequence(self):
+        """Sequence number of the newest complete frame (0 before the first)"""
+        return int(self.header[_SEQUENCE])
+
+    @property
+    def closed(self):
+        return bool(self.header[_CLOSED])
+
+    def oldest(self):
+        """Oldest sequence that is still safe to read"""
+        return max(1, self.sequence - self.slots + 2)
+
+    def read(self, sequence):
+        slot = sequence % self.slots
+        entry = self.table[slot]
+        if entry[_END] != sequence or entry[_BEGIN] != sequence:
+            return None
+        return int(entry[_TIME]), self.frames[slot], self.masks[slot]
+
+    def valid(self, sequence):
+        """Whether the views of `sequence` still hold that frame"""
+        return self.table[sequence % self.slots, _BEGIN] == sequence
+
+    def wait(self, after=0, timeout=None, poll_interval=0.001):
+        """Newest sequence past `after`, polling until there is one; None on timeout or when closed"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            sequence = self.sequence
+            if sequence > after:
+                return sequence
+            if self.closed or (deadline is not None and time.perf_counter() >= deadline):
+                return None
+            time.sleep(poll_interval)
+
+    def close(self):
+        self.header = self.table = self.frames = self.masks = None
+        self.shm.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Follow a frame bus and report what arrives')
+    parser.add_argument('name', help='Bus name given to --frame-bus')
+    parser.add_argument('--every-frame', action='store_true',
+                        help='Read every frame in order (like a recorder) instead of jumping to the newest')
+    parser.add_argument('--interval', type=float, default=2.0, help='Seconds between reports (default: 2)')
+    args = parser.parse_args()
+
+    try:
+        bus = FrameBusReader(args.name)
+    except Exception as e:
+        print(f"Could not attach to {args.name!r}: {e}")
+        sys.exit(1)
+
+    height, width, channels = bus.frame_shape
+    print(f"Attached to {args.name}: {width}x{height}x{channels}, {bus.slots} slots")
+
+    received = skipped = 0
+    latency_ms = coverage = 0.0
+    last = bus.sequence
+    last_report = time.perf_counter()
+    try:
+        while True:
+            newest = bus.wait(last, timeout=1.0)
+            if newest is None:
+                if bus.closed:
+                    break
+                continue
+
+            sequence = max(last + 1, bus.oldest()) if args.every_frame else newest
+            skipped += sequence - last - 1
+            while sequence <= newest:
+                view = bus.read(sequence)
+                if view is not None:
+                    timestamp, frame, mask = view
+                    coverage = np.count_nonzero(mask) / mask.size
+                    if bus.valid(sequence):
+                        received += 1
+                        latency_ms = (time.time_ns() - timestamp) / 1e6
+                    else:
+                        skipped += 1
+                else:
+                    skipped += 1
+                last = sequence
+                sequence += 1
+
+            if time.perf_counter() - last_report >= args.interval:
+                print(f"Frame {last}: {received} received, {skipped} skipped, "
+                      f"latency {latency_ms:.2f} ms, cloak {coverage:.1%}")
+                last_report = time.perf_counter()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.close()
+
+    print(f"Done: {received} frames received, {skipped} skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Raw Frame Recording for Invisibility Cloak
+Uncompressed, memory-mapped frame files for repeatable replay and benchmarks
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+RECORDING_EXTENSION = '.cloakraw'
+MAGIC = b'CLOAKRAW'
+VERSION = 1
+
+# 64-byte file header; frame_count is kept current while recording so a
+# file cut short by a crash still opens with every frame written so far
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('width', '<u4'),
+    ('height', '<u4'),
+    ('channels', '<u4'),
+    ('fps', '<f8'),
+    ('frame_count', '<u8'),
+    ('record_bytes', '<u8'),
+    ('reserved', 'V16'),
+])
+
+ALIGN = 64
+
+
+def record_dtype(height, width, channels=3):
+    """
+    One fixed-size record per frame: index, timestamp, then the pixels.
+
+    Records are padded to 64 bytes so every frame starts cache-line
+    aligned, and because they are fixed-size the index of frame n is
+    simply its position: random access is one offset computation.
+    """
+    frame_bytes = height * width * channels
+    fields = [
+        ('index', '<u8'),
+        ('timestamp_ns', '<i8'),
+        ('reserved', 'V48'),
+        ('frame', 'u1', (height, width, channels)),
+    ]
+    padding = -frame_bytes % ALIGN
+    if padding:
+        fields.append(('padding', f'V{padding}'))
+    return np.dtype(fields)
+
+
+class RawFrameWriter:
+    """
+    Writes frames into a memory-mapped .cloakraw file.
+
+    Has the cv2.VideoWriter interface (write/release/isOpened), so
+    open_video_writer() hands it out for .cloakraw paths and everything
+    that records video (--output, --record, offline_render.py) can write
+    raw frames as well. The file grows `chunk_frames` records at a time
+    and is trimmed to the frames written on release().
+    """
+
+    def __init__(self, path, fps, frame_size, channels=3, chunk_frames=64):
+        width, height = frame_size
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.dtype = record_dtype(height, width, channels)
+        self.frame_shape = (height, width, channels)
+        self.frame_count = 0
+        self._capacity = 0
+        self._records = None
+
+        with open(path, 'wb') as f:
+            f.truncate(HEADER_DTYPE.itemsize)
+        self._header = np.memmap(path, HEADER_DTYPE, 'r+', shape=(1,))
+        header = self._header[0]
+        header['magic'] = MAGIC
+        header['version'] = VERSION
+        header['width'] = width
+        header['height'] = height
+        header['channels'] = channels
+        header['fps'] = fps if fps and 0 < fps <= 1000 else 30.0
+        header['frame_count'] = 0
+        header['record_bytes'] = self.dtype.itemsize
+
+    def isOpened(self):
+        return self._header is not None
+
+    def _grow(self):
+        if self._records is not None:
+            self._records.flush()
+        self._capacity += self.chunk_frames
+        # numpy extends the file to fit the larger map
+        self._records = np.memmap(self.path, self.dtype, 'r+', offset=HEADER_DTYPE.itemsize,
+                                  shape=(self._capacity,))
+
+    def write(self, frame, timestamp_ns=None):
+        if frame.shape != self.frame_shape:
+            raise Exception(f"Frame shape {frame.shape} does not match the recording {self.frame_shape}")
+        if self.frame_count == self._capacity:
+            self._grow()
+
+        record = self._records[self.frame_count]
+        record['index'] = self.frame_count
+        record['timestamp_ns'] = time.time_ns() if timestamp_ns is None else timestamp_ns
+        np.copyto(self._records['frame'][self.frame_count], frame)
+
+        self.frame_count += 1
+        self._header[0]['frame_count'] = self.frame_count
+
+    def release(self):
+        if self._header is None:
+            return
+        if self._records is not None:
+            self._records.flush()
+            self._records = None
+        self._header.flush()
+        self._header = None
+        # Drop the unused tail of the last chunk
+        os.truncate(self.path, HEADER_DTYPE.itemsize + self.frame_count * self.dtype.itemsize)
+
+
+class RawRecording:
+    """
+    Read-only memory map of a .cloakraw file.
+
+    frames[n] is an (H, W, C) np.memmap slice straight into the page
+    cache: no decoding and no copy. The same bytes come back on every
+    run, which a compressed video with a codec in between cannot promise.
+    timestamps and indices are the per-frame columns.
+    """
+
+    def __init__(self, path):
+        header = np.fromfile(path, HEADER_DTYPE, count=1)
+        if len(header) != 1 or header[0]['magic'] != MAGIC:
+            raise Exception(f"{path} is not a {RECORDING_EXTENSION} recording")
+        header = header[0]
+        if header['version'] != VERSION:
+            raise Exception(f"{path}: unsupported recording version {header['version']}")
+
+        self.path = path
+        self.width = int(header['width'])
+        self.height = int(header['height'])
+        self.channels = int(header['channels'])
+        self.fps = float(header['fps'])
+        self.dtype = record_dtype(self.height, self.width, self.channels)
+
+        # Trust the file size over the header if the recorder was killed mid-frame
+        available = (os.path.getsize(path) - HEADER_DTYPE.itemsize) // self.dtype.itemsize
+        count = min(int(header['frame_count']), available)
+        self.records = (np.memmap(path, self.dtype, 'r', offset=HEADER_DTYPE.itemsize, shape=(count,))
+                        if count else np.zeros(0, self.dtype))
+        self.frames = self.records['frame']
+        self.timestamps = self.records['timestamp_ns']
+        self.indices = self.records['index']
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+
+def main():
+    # frame_sources imports this module for replay
+    from frame_sources import open_frame_source
+
+    parser = argparse.ArgumentParser(description=f'Record a camera or convert a clip into a raw {RECORDING_EXTENSION} file')
+    parser.add_argument('input', help='Camera index, video file, image directory or raw:<path> stream')
+    parser.add_argument('output', help=f'Recording to write (*{RECORDING_EXTENSION})')
+    parser.add_argument('--max-frames', type=int, default=None, help='Stop after this many frames')
+    parser.add_argument('--width', type=int, default=640, help='Camera or raw stream width (default: 640)')
+    parser.add_argument('--height', type=int, default=480, help='Camera or raw stream height (default: 480)')
+    args = parser.parse_args()
+
+    cap = open_frame_source(args.input, args.width, args.height)
+    if not cap.isOpened():
+        print(f"Could not open {args.input!r}")
+        sys.exit(1)
+
+    writer = None
+    try:
+        while writer is None or args.max_frames is None or writer.frame_count < args.max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if writer is None:
+                writer = RawFrameWriter(args.output, cap.get(cv2.CAP_PROP_FPS), (frame.shape[1], frame.shape[0]))
+            writer.write(frame)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+
+    if writer is None:
+        print(f"No frames read from {args.input!r}")
+        sys.exit(1)
+    size = os.path.getsize(args.output) / 2 ** 20
+    print(f"Wrote {writer.frame_count} frames to {args.output} ({size:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
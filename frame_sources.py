@@ -0,0 +1,326 @@
+"""
+Frame Sources for Invisibility Cloak
+Camera, video file, image directory, raw stream and raw recording backends behind one interface
+"""
+
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from frame_recording import RECORDING_EXTENSION, RawRecording
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+class FrameSource:
+    """
+    Base class for frame sources.
+
+    Mirrors the subset of the cv2.VideoCapture API used by the cloak
+    (isOpened/read/get/set/release), so a source can be dropped in
+    wherever a capture object was used before.
+    """
+
+    def __init__(self):
+        self.width = 0
+        self.height = 0
+        self.fps = 0.0
+        self.frame_index = 0
+
+    def isOpened(self):
+        """Return True if the source can deliver frames"""
+        return False
+
+    def read(self, image=None):
+        """Return (ret, frame) like cv2.VideoCapture.read"""
+        return False, None
+
+    def get(self, prop):
+        """Query a capture property"""
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.frame_index)
+        return 0.0
+
+    def set(self, prop, value):
+        """Set a capture property; ignored by sources that cannot honour it"""
+        return False
+
+    def release(self):
+        """Release any underlying resources"""
+        pass
+
+    @property
+    def is_live(self):
+        """True for sources that produce frames in real time (cameras)"""
+        return False
+
+
+class CaptureSource(FrameSource):
+    """Source backed by cv2.VideoCapture (cameras and video files)"""
+
+    def __init__(self, target):
+        super().__init__()
+        self.target = target
+        self.cap = cv2.VideoCapture(target)
+        self._update_size()
+
+    def _update_size(self):
+        if self.cap.isOpened():
+            self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, image=None):
+        ret, frame = self.cap.read(image)
+        if ret:
+            self.frame_index += 1
+        return ret, frame
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        result = self.cap.set(prop, value)
+        self._update_size()
+        return result
+
+    def release(self):
+        self.cap.release()
+
+
+class CameraSource(CaptureSource):
+    """Live camera identified by its index"""
+
+    def __init__(self, camera_index=0, width=640, height=480, fps=30):
+        super().__init__(camera_index)
+        if self.cap.isOpened():
+            self.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            self.set(cv2.CAP_PROP_FPS, fps)
+
+    @property
+    def is_live(self):
+        return True
+
+
+class VideoFileSource(CaptureSource):
+    """Recorded video file, decoded as fast as frames are requested"""
+
+    def __init__(self, path, loop=False):
+        super().__init__(path)
+        self.path = path
+        self.loop = loop
+
+    def read(self, image=None):
+        ret, frame = super().read(image)
+        if not ret and self.loop and self.frame_index > 0:
+            # Rewind and try once more
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = super().read(image)
+        return ret, frame
+
+
+class ImageSequenceSource(FrameSource):
+    """Directory of still images played back in file name order"""
+
+    def __init__(self, directory, fps=30.0, loop=False):
+        super().__init__()
+        self.directory = directory
+        self.fps = fps
+        self.loop = loop
+        self.files = []
+        if os.path.isdir(directory):
+            self.files = sorted(
+                os.path.join(directory, name) for name in os.listdir(directory)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        self._position = 0
+        if self.files:
+            first = cv2.imread(self.files[0])
+            if first is not None:
+                self.height, self.width = first.shape[:2]
+
+    def isOpened(self):
+        return len(self.files) > 0 and self.width > 0
+
+    def read(self, image=None):
+        if self._position >= len(self.files):
+            if not self.loop or not self.files:
+                return False, None
+            self._position = 0
+
+        frame = cv2.imread(self.files[self._position])
+        self._position += 1
+        if frame is None:
+            return False, None
+
+        if image is not None and image.shape == frame.shape:
+            image[...] = frame
+            frame = image
+        self.frame_index += 1
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.files))
+        return super().get(prop)
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self._position = max(0, min(int(value), len(self.files)))
+            return True
+        return False
+
+
+class RawStreamSource(FrameSource):
+    """
+    Headerless stream of packed BGR24 frames, e.g. piped from ffmpeg:
+
+        ffmpeg -i in.mp4 -f rawvideo -pix_fmt bgr24 - | python app.py --source raw:-
+    """
+
+    def __init__(self, stream, width, height, fps=30.0):
+        super().__init__()
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frame_bytes = width * height * 3
+        self._owns_stream = False
+
+        if stream == '-':
+            self.stream = sys.stdin.buffer
+        elif isinstance(stream, str):
+            self.stream = open(stream, 'rb')
+            self._owns_stream = True
+        else:
+            self.stream = stream
+
+    def isOpened(self):
+        return self.stream is not None and self.frame_bytes > 0
+
+    def read(self, image=None):
+        if self.stream is None:
+            return False, None
+
+        if image is None or image.shape != (self.height, self.width, 3):
+            image = np.empty((self.height, self.width, 3), np.uint8)
+
+        # readinto fills the frame buffer directly, no intermediate bytes object
+        view = memoryview(image.reshape(-1))
+        filled = 0
+        while filled < self.frame_bytes:
+            count = self.stream.readinto(view[filled:])
+            if not count:
+                return False, None
+            filled += count
+
+        self.frame_index += 1
+        return True, image
+
+    def release(self):
+        if self._owns_stream and self.stream is not None:
+            self.stream.close()
+        self.stream = None
+
+
+class RecordingSource(FrameSource):
+    """
+    Replays a .cloakraw recording (see frame_recording.py) with no decoding.
+
+    read() returns the next frame as a read-only np.memmap slice into the
+    file; `image` is ignored, since copying into it would only add work.
+    Frames are also random-access: set(CAP_PROP_POS_FRAMES, n) seeks
+    instantly and frame_at(n) returns any frame directly.
+    """
+
+    def __init__(self, path, loop=False):
+        super().__init__()
+        self.path = path
+        self.loop = loop
+        self.recording = RawRecording(path)
+        self.width = self.recording.width
+        self.height = self.recording.height
+        self.fps = self.recording.fps
+        self._position = 0
+
+    def isOpened(self):
+        return self.recording is not None and len(self.recording) > 0
+
+    def frame_at(self, index):
+        return self.recording.frames[index]
+
+    def timestamp_at(self, index):
+        """Capture time of frame `index` in nanoseconds since the epoch"""
+        return int(self.recording.timestamps[index])
+
+    def read(self, image=None):
+        if self.recording is None:
+            return False, None
+        if self._position >= len(self.recording):
+            if not self.loop or not len(self.recording):
+                return False, None
+            self._position = 0
+
+        frame = self.recording.frames[self._position]
+        self._position += 1
+        self.frame_index += 1
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.recording))
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._position)
+        if prop == cv2.CAP_PROP_POS_MSEC and 0 < self._position <= len(self.recording):
+            # Time of the frame last read, relative to the first
+            return (self.timestamp_at(self._position - 1) - self.timestamp_at(0)) / 1e6
+        return super().get(prop)
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self._position = max(0, min(int(value), len(self.recording)))
+            return True
+        return False
+
+    def release(self):
+        # Frames already handed out keep the map alive until they are dropped
+        self.recording = None
+
+
+def open_frame_source(spec=0, width=640, height=480, fps=30, loop=False):
+    """
+    Create a frame source from a command-line style specification.
+
+    - int or digit string: camera index
+    - "raw:<path>" or "raw:-": raw BGR24 stream of width x height frames
+    - directory: image sequence
+    - *.cloakraw: raw recording (see frame_recording.py)
+    - anything else: video file
+    """
+    if isinstance(spec, FrameSource):
+        return spec
+
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        return CameraSource(int(spec), width, height, fps)
+
+    if spec.startswith('raw:'):
+        return RawStreamSource(spec[len('raw:'):], width, height, fps)
+
+    if os.path.isdir(spec):
+        return ImageSequenceSource(spec, fps=fps, loop=loop)
+
+    if spec.lower().endswith(RECORDING_EXTENSION):
+        return RecordingSource(spec, loop=loop)
+
+    return VideoFileSource(spec, loop=loop)
@@ -0,0 +1,267 @@
+"""
+HSV Range Tuner for Invisibility Cloak
+Finds the HSV range that best separates labelled cloak pixels from the
+rest, using a 3D histogram and summed-volume tables instead of re-masking
+every frame for every candidate range
+"""
+
+import argparse
+import sys
+
+import cv2
+import numpy as np
+
+from color_config import save_color_config
+from color_detection_demo import ColorDetectionDemo
+from frame_sources import open_frame_source
+
+# OpenCV's 8-bit HSV: hue is 0-179, saturation and value 0-255
+CHANNEL_SIZES = (180, 256, 256)
+
+
+def parse_sample(spec):
+    """'clip.mp4' or 'clip.mp4@x,y,w,h' -> (source, region or None)"""
+    source, _, region = spec.rpartition('@')
+    if not source or region.count(',') != 3:
+        return spec, None
+    x, y, w, h = (int(value) for value in region.split(','))
+    return source, (x, y, w, h)
+
+
+def summed_volume(hist):
+    """Zero-padded 3D prefix sums: table[h, s, v] = hist[:h, :s, :v].sum()"""
+    table = np.zeros(tuple(n + 1 for n in hist.shape), np.float64)
+    table[1:, 1:, 1:] = hist.cumsum(0).cumsum(1).cumsum(2)
+    return table
+
+
+def box_sums(table, lower, upper):
+    """
+    Histogram mass inside bin boxes [lower, upper), vectorized.
+
+    lower and upper are integer arrays of shape (..., 3); each box costs
+    eight table lookups regardless of its size.
+    """
+    h0, s0, v0 = lower[..., 0], lower[..., 1], lower[..., 2]
+    h1, s1, v1 = upper[..., 0], upper[..., 1], upper[..., 2]
+    return (table[h1, s1, v1] - table[h0, s1, v1] - table[h1, s0, v1] - table[h1, s1, v0]
+            + table[h0, s0, v1] + table[h0, s1, v0] + table[h1, s0, v0] - table[h0, s0, v0])
+
+
+class HSVRangeTuner:
+    """
+    Accumulate labelled HSV pixels and search for the best inRange box.
+
+    Positive (cloak) and negative (everything else) pixels go into two 3D
+    histograms of `bins` cells. Once both are turned into summed-volume
+    tables, the number of positives and negatives inside any candidate
+    box is an O(1) lookup, so whole families of candidates are scored in
+    one vectorized step. The search is coordinate ascent on the
+    intersection over union between the box and the positive pixels:
+    for each channel in turn, every (lower, upper) pair is tried with the
+    other two channels fixed, until nothing improves. Hue ranges may wrap
+    around 180 (as red does), which yields two inRange ranges.
+    """
+
+    def __init__(self, bins=(45, 32, 32)):
+        for size, count in zip(CHANNEL_SIZES, bins):
+            if size % count:
+                raise ValueError(f"{count} bins do not divide the channel range {size}")
+        self.bins = tuple(bins)
+        self.positive = np.zeros(self.bins, np.float64)
+        self.negative = np.zeros(self.bins, np.float64)
+
+    def add_frame(self, frame, positive_mask=None, all_positive=False):
+        """Add a BGR frame; pixels under positive_mask (or all of them) count as cloak"""
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        ranges = [0, CHANNEL_SIZES[0], 0, CHANNEL_SIZES[1], 0, CHANNEL_SIZES[2]]
+
+        if all_positive:
+            self.positive += cv2.calcHist([hsv], [0, 1, 2], None, list(self.bins), ranges)
+            return
+        if positive_mask is None:
+            self.negative += cv2.calcHist([hsv], [0, 1, 2], None, list(self.bins), ranges)
+            return
+
+        self.positive += cv2.calcHist([hsv], [0, 1, 2], positive_mask, list(self.bins), ranges)
+        self.negative += cv2.calcHist([hsv], [0, 1, 2], cv2.bitwise_not(positive_mask), list(self.bins), ranges)
+
+    def _counts(self, tables, hue, sat, val):
+        """Mass inside boxes given as (lo, hi) bin arrays per channel; hue may wrap"""
+        hue_lo, hue_hi = hue
+        wraps = hue_lo >= hue_hi
+        lower = np.stack(np.broadcast_arrays(hue_lo, sat[0], val[0]), -1)
+        upper = np.stack(np.broadcast_arrays(np.where(wraps, self.bins[0], hue_hi), sat[1], val[1]), -1)
+        counts = box_sums(tables, lower, upper)
+
+        # Wrapped hue: add the [0, hi) part
+        if wraps.any():
+            lower[..., 0] = 0
+            upper[..., 0] = np.broadcast_to(hue_hi, upper.shape[:-1])
+            counts = counts + np.where(wraps, box_sums(tables, lower, upper), 0.0)
+        return counts
+
+    def score(self, box):
+        """(IoU, recall, precision) of a box of bin bounds ((h0, h1), (s0, s1), (v0, v1))"""
+        positive_table, negative_table, total = self._tables()
+        args = [tuple(np.asarray(bound) for bound in axis) for axis in box]
+        tp = float(self._counts(positive_table, *args))
+        fp = float(self._counts(negative_table, *args))
+        return self._iou(tp, fp, total), tp / total if total else 0.0, tp / (tp + fp) if tp + fp else 0.0
+
+    def _tables(self):
+        return summed_volume(self.positive), summed_volume(self.negative), float(self.positive.sum())
+
+    @staticmethod
+    def _iou(tp, fp, total):
+        # Union of the box and the cloak pixels: all positives plus the negatives let in
+        union = total + fp
+        return np.where(union > 0, tp / np.maximum(union, 1e-12), 0.0)
+
+    @staticmethod
+    def _pairs(count, wrap):
+        """Every (lo, hi) bin pair; with wrap, lo > hi means [lo, end) + [0, hi)"""
+        lo, hi = np.meshgrid(np.arange(count + 1), np.arange(count + 1), indexing='ij')
+        if wrap:
+            keep = (lo != hi) & (lo < count) & (hi > 0)
+        else:
+            keep = lo < hi
+        return lo[keep], hi[keep]
+
+    def search(self, max_rounds=10):
+        """Return (box, IoU, candidates scored) for the best box found"""
+        positive_table, negative_table, total = self._tables()
+        if total == 0:
+            raise ValueError("No positive (cloak) pixels were sampled")
+
+        box = [[0, self.bins[0]], [0, self.bins[1]], [0, self.bins[2]]]
+        best = -1.0
+        evaluated = 0
+
+        for _ in range(max_rounds):
+            improved = False
+            for axis in range(3):
+                lo, hi = self._pairs(self.bins[axis], wrap=(axis == 0))
+                args = [(np.asarray(b[0]), np.asarray(b[1])) for b in box]
+                args[axis] = (lo, hi)
+
+                tp = self._counts(positive_table, *args)
+                fp = self._counts(negative_table, *args)
+                scores = self._iou(tp, fp, total)
+                evaluated += len(scores)
+
+                index = int(np.argmax(scores))
+                if scores[index] > best + 1e-12:
+                    best = float(scores[index])
+                    box[axis] = [int(lo[index]), int(hi[index])]
+                    improved = True
+            if not improved:
+                break
+
+        return tuple(tuple(axis) for axis in box), best, evaluated
+
+    def to_ranges(self, box):
+        """Bin box -> list of inclusive (lower, upper) arrays for cv2.inRange"""
+        widths = [size // count for size, count in zip(CHANNEL_SIZES, self.bins)]
+        (h0, h1), (s0, s1), (v0, v1) = box
+        sat = (s0 * widths[1], s1 * widths[1] - 1)
+        val = (v0 * widths[2], v1 * widths[2] - 1)
+
+        if h0 < h1:
+            hue_spans = [(h0 * widths[0], h1 * widths[0] - 1)]
+        else:
+            hue_spans = [(0, h1 * widths[0] - 1), (h0 * widths[0], CHANNEL_SIZES[0] - 1)]
+
+        return [(np.array([h_lo, sat[0], val[0]]), np.array([h_hi, sat[1], val[1]]))
+                for h_lo, h_hi in hue_spans]
+
+
+def add_source(tuner, source, region=None, all_positive=False, every=1, max_frames=None):
+    """Feed every `every`-th frame of a source; returns the number of frames used"""
+    cap = open_frame_source(source)
+    if not cap.isOpened():
+        raise Exception(f"Could not open sample {source!r}")
+
+    used = 0
+    index = 0
+    mask = None
+    try:
+        while max_frames is None or used < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            index += 1
+            if (index - 1) % every:
+                continue
+
+            if region is not None:
+                if mask is None or mask.shape != frame.shape[:2]:
+                    mask = np.zeros(frame.shape[:2], np.uint8)
+                    x, y, w, h = region
+                    mask[y:y + h, x:x + w] = 255
+                tuner.add_frame(frame, mask)
+            else:
+                tuner.add_frame(frame, all_positive=all_positive)
+            used += 1
+    finally:
+        cap.release()
+
+    if used == 0:
+        raise Exception(f"No frames read from {source!r}")
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune HSV ranges for a cloak color from labelled sample clips')
+    parser.add_argument('--positive', action='append', default=[], metavar='SOURCE[@x,y,w,h]',
+                        help='Clip or image directory showing the cloak; with a region, only that area is cloak '
+                             'and the rest counts as background (repeatable)')
+    parser.add_argument('--negative', action='append', default=[], metavar='SOURCE',
+                        help='Clip or image directory with no cloak in it (repeatable)')
+    parser.add_argument('--name', default='red', help='Color name to write (default: red, the cloak color)')
+    parser.add_argument('--display-color', type=int, nargs=3, default=None, metavar=('B', 'G', 'R'),
+                        help='Overlay color for the demo (default: kept from the demo palette or white)')
+    parser.add_argument('--output', default='colors.json', help='Config file to write or update (default: colors.json)')
+    parser.add_argument('--bins', type=int, nargs=3, default=[45, 32, 32], metavar=('H', 'S', 'V'),
+                        help='Histogram bins per channel (default: 45 32 32)')
+    parser.add_argument('--every', type=int, default=1, help='Use every N-th frame (default: 1)')
+    parser.add_argument('--max-frames', type=int, default=None, help='Frames to use per sample (default: all)')
+    args = parser.parse_args()
+
+    if not args.positive:
+        parser.error("at least one --positive sample is required")
+
+    tuner = HSVRangeTuner(tuple(args.bins))
+    try:
+        for spec in args.positive:
+            source, region = parse_sample(spec)
+            used = add_source(tuner, source, region, all_positive=region is None,
+                              every=args.every, max_frames=args.max_frames)
+            print(f"Positive {spec}: {used} frames")
+        for source in args.negative:
+            used = add_source(tuner, source, every=args.every, max_frames=args.max_frames)
+            print(f"Negative {source}: {used} frames")
+
+        box, iou, evaluated = tuner.search()
+    except Exception as e:
+        print(f"Tuning failed: {e}")
+        sys.exit(1)
+
+    _, recall, precision = tuner.score(box)
+    ranges = tuner.to_ranges(box)
+    print(f"Scored {evaluated} candidate ranges")
+    print(f"IoU {iou:.4f}  recall {recall:.4f}  precision {precision:.4f}")
+    for lower, upper in ranges:
+        print(f"  lower {lower.tolist()}  upper {upper.tolist()}")
+
+    if args.display_color is not None:
+        display_color = tuple(args.display_color)
+    else:
+        display_color = ColorDetectionDemo().colors.get(args.name, {}).get('color', (255, 255, 255))
+
+    save_color_config(args.output, {args.name: {'ranges': ranges, 'color': display_color}})
+    print(f"Saved '{args.name}' to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,45 +7,67 @@ import cv2
 import numpy as np
 import time
 
-def create_invisibility_cloak():
+from frame_sources import open_frame_source
+from warmup import WarmupMonitor
+
+def create_invisibility_cloak(source=0, fast_start=False):
     """
     Main function to create the invisibility cloak effect
+    
+    source can be a camera index, a video file, an image directory or
+    "raw:<path>" for a BGR24 stream (see frame_sources.py). With
+    fast_start the countdown is skipped and the background is taken as
+    soon as the camera image stops changing.
     """
+    launch_time = time.perf_counter()
     print("Starting Invisibility Cloak...")
     print("Please move out of the camera view when the countdown starts!")
     
-    # Initialize webcam
-    cap = cv2.VideoCapture(0)
+    # Initialize webcam (at 640x480 for better performance) or another source
+    cap = open_frame_source(source, 640, 480)
     
     # Check if camera opened successfully
     if not cap.isOpened():
         print("Error: Could not open camera")
         return
     
-    # Set camera resolution for better performance
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    
     print("Camera initialized successfully!")
-    print("Countdown starting in 3 seconds...")
-    time.sleep(3)
     
-    print("Capturing background... Please move out of the frame!")
-    
-    # Capture background frame
-    # Let the camera adjust to lighting conditions
-    for i in range(60):
-        ret, background = cap.read()
-        if not ret:
-            print("Error: Failed to capture background")
-            cap.release()
-            return
-        
-        # Show countdown
-        if i % 10 == 0:
-            print(f"Capturing background frame {i+1}/60")
-    
-    print("Background captured successfully!")
+    if fast_start:
+        # Read only until exposure and white balance have settled
+        print("Capturing background once the camera settles... Please stay out of the frame!")
+        monitor = WarmupMonitor()
+        while not monitor.done:
+            ret, background = cap.read()
+            if not ret:
+                print("Error: Failed to capture background")
+                cap.release()
+                return
+            monitor.update(background)
+        if monitor.converged:
+            print(f"Background captured after {monitor.frames} frames")
+        else:
+            print(f"Warning: camera did not settle within {monitor.frames} frames; using the last one")
+    else:
+        print("Countdown starting in 3 seconds...")
+        time.sleep(3)
+        
+        print("Capturing background... Please move out of the frame!")
+        
+        # Capture background frame
+        # Let the camera adjust to lighting conditions
+        for i in range(60):
+            ret, background = cap.read()
+            if not ret:
+                print("Error: Failed to capture background")
+                cap.release()
+                return
+            
+            # Show countdown
+            if i % 10 == 0:
+                print(f"Capturing background frame {i+1}/60")
+        
+        print("Background captured successfully!")
     
     # Flip the background for mirror effect
     background = cv2.flip(background, 1)
@@ -54,6 +76,16 @@ def create_invisibility_cloak():
     print("Wear something bright red to become invisible!")
     print("Press 'q' to quit")
     
+    # Define HSV range for bright red once, outside the frame loop
+    # Red color wraps around in HSV, so we need two ranges
+    lower_red1 = np.array([0, 120, 70])
+    upper_red1 = np.array([10, 255, 255])
+    lower_red2 = np.array([170, 120, 70])
+    upper_red2 = np.array([180, 255, 255])
+    
+    # Kernel for the morphological clean-up
+    kernel = np.ones((3, 3), np.uint8)
+    
     # Main processing loop
     while True:
         # Read current frame
@@ -68,17 +100,10 @@ def create_invisibility_cloak():
         # Convert BGR to HSV for better color detection
         hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
         
-        # Define HSV range for bright red
-        # Red color wraps around in HSV, so we need two ranges
-        
         # Lower red range (0-10 degrees)
-        lower_red1 = np.array([0, 120, 70])
-        upper_red1 = np.array([10, 255, 255])
         mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
         
         # Upper red range (170-180 degrees)
-        lower_red2 = np.array([170, 120, 70])
-        upper_red2 = np.array([180, 255, 255])
         mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
         
         # Combine both masks
@@ -86,7 +111,6 @@ def create_invisibility_cloak():
         
         # Refine the mask using morphological operations
         # Remove noise
-        kernel = np.ones((3, 3), np.uint8)
         mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
         
         # Fill holes and expand the detected regions
@@ -108,6 +132,10 @@ def create_invisibility_cloak():
         # Display the result
         cv2.imshow('Invisibility Cloak', final_output)
         
+        if launch_time is not None:
+            print(f"Time to first composited frame: {time.perf_counter() - launch_time:.2f}s")
+            launch_time = None
+        
         # Optional: Show the mask for debugging
         # cv2.imshow('Mask', mask)
         
@@ -157,13 +185,16 @@ if __name__ == "__main__":
     print("=== Invisibility Cloak Project ===")
     print("1. Test Camera")
     print("2. Start Invisibility Cloak")
+    print("3. Start Invisibility Cloak (fast start, no countdown)")
     
-    choice = input("Enter your choice (1 or 2): ").strip()
+    choice = input("Enter your choice (1, 2 or 3): ").strip()
     
     if choice == "1":
         test_camera()
     elif choice == "2":
         create_invisibility_cloak()
+    elif choice == "3":
+        create_invisibility_cloak(fast_start=True)
     else:
         print("Invalid choice. Starting invisibility cloak by default...")
         create_invisibility_cloak()
\ No newline at end of file
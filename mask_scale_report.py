@@ -0,0 +1,116 @@
+"""
+Mask Resolution Report for Invisibility Cloak
+Quality vs speed of computing the cloak mask at reduced resolution or
+with a different cleanup method
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from advanced_invisibility_cloak import InvisibilityCloak
+from frame_buffers import FramePool
+from frame_sources import open_frame_source
+
+
+def mask_iou(mask_a, mask_b):
+    """Intersection over union of two binary masks (1.0 when both are empty)"""
+    a = mask_a > 0
+    b = mask_b > 0
+    union = np.count_nonzero(a | b)
+    if union == 0:
+        return 1.0
+    return np.count_nonzero(a & b) / union
+
+
+def load_frames(source, max_frames, width, height):
+    """Read and mirror up to max_frames frames so every scale sees the same input"""
+    cap = open_frame_source(source, width, height)
+    if not cap.isOpened():
+        raise Exception(f"Could not open frame source {source!r}")
+
+    frames = []
+    try:
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.flip(frame, 1))
+    finally:
+        cap.release()
+
+    if not frames:
+        raise Exception(f"No frames read from {source!r}")
+    return frames
+
+
+def evaluate_scale(frames, scale, refine_method='separable'):
+    """Time mask computation at one scale; return (ms per frame, masks)"""
+    height, width = frames[0].shape[:2]
+    cloak = InvisibilityCloak(width=width, height=height, mask_scale=scale, refine_method=refine_method)
+    cloak.pool = FramePool(width, height)
+
+    masks = []
+    elapsed = 0.0
+    for frame in frames:
+        start = time.perf_counter()
+        mask = cloak.compute_mask(frame)
+        elapsed += time.perf_counter() - start
+        masks.append(mask.copy())
+
+    return elapsed / len(frames) * 1000, masks
+
+
+def print_row(label, ms, base_ms, reference, masks):
+    # Frames without any cloak in either mask count as perfect agreement
+    ious = [mask_iou(ref, mask) for ref, mask in zip(reference, masks)]
+    print(f"{label:>10}{ms:>10.3f}{base_ms / ms:>8.2f}x{np.mean(ious):>10.4f}{np.min(ious):>9.4f}")
+
+
+def report(sources, scales=(1.0, 0.5, 0.25), max_frames=300, width=640, height=480, refine_methods=()):
+    """Print timing and IoU against the full-resolution mask for each clip"""
+    for source in sources:
+        frames = load_frames(source, max_frames, width, height)
+        height_px, width_px = frames[0].shape[:2]
+        print(f"\n{source}: {len(frames)} frames at {width_px}x{height_px}")
+        print(f"{'scale':>10}{'ms/frame':>10}{'speedup':>9}{'mean IoU':>10}{'min IoU':>9}")
+
+        base_ms, reference = evaluate_scale(frames, 1.0)
+        for scale in scales:
+            if scale == 1.0:
+                ms, masks = base_ms, reference
+            else:
+                ms, masks = evaluate_scale(frames, scale)
+            print_row(f"{scale:.3g}", ms, base_ms, reference, masks)
+
+        if refine_methods:
+            # Cleanup methods against the step-by-step morphology at full resolution
+            print(f"{'refine':>10}{'ms/frame':>10}{'speedup':>9}{'mean IoU':>10}{'min IoU':>9}")
+            morph_ms, morph_masks = evaluate_scale(frames, 1.0, 'morph')
+            for method in refine_methods:
+                if method == 'morph':
+                    ms, masks = morph_ms, morph_masks
+                else:
+                    ms, masks = evaluate_scale(frames, 1.0, method)
+                print_row(method, ms, morph_ms, morph_masks, masks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quality vs speed report for reduced-resolution mask computation')
+    parser.add_argument('sources', nargs='+', help='Recorded clips (any frame source specification)')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0, 0.5, 0.25], help='Mask scales to compare')
+    parser.add_argument('--refine-methods', nargs='+', choices=InvisibilityCloak.REFINE_METHODS, default=[],
+                        help='Also compare these mask cleanup methods against morph')
+    parser.add_argument('--max-frames', type=int, default=300, help='Frames to read per clip (default: 300)')
+    parser.add_argument('--width', type=int, default=640, help='Frame width for raw or camera sources (default: 640)')
+    parser.add_argument('--height', type=int, default=480, help='Frame height for raw or camera sources (default: 480)')
+    args = parser.parse_args()
+
+    report(args.sources, tuple(args.scales), args.max_frames, args.width, args.height,
+           tuple(args.refine_methods))
+
+
+if __name__ == "__main__":
+    main()
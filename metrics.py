@@ -0,0 +1,200 @@
+"""
+Metrics for Invisibility Cloak
+Low-overhead stage timers, rolling latency percentiles and file export
+"""
+
+import json
+import os
+import time
+from collections import deque
+from contextlib import nullcontext
+
+import cv2
+import numpy as np
+
+# Shared no-op context returned while metrics are disabled
+_NULL_STAGE = nullcontext()
+
+
+class _StageTimer:
+    """Context manager that records one stage duration"""
+
+    __slots__ = ('samples', 'start')
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.samples.append(time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    Per-stage latency histograms and frame counters for the main loop.
+
+    Use `with metrics.stage('mask'):` around each stage and call
+    frame_done() once per frame. Percentiles are computed over the last
+    `window` samples only when a snapshot is taken, so recording costs
+    two perf_counter calls and a deque append. When disabled, stage()
+    returns a shared no-op context and frame_done() returns immediately.
+    """
+
+    def __init__(self, enabled=False, window=300, export_path=None, export_format='jsonl',
+                 export_interval=5.0, overlay=False):
+        if export_format not in ('jsonl', 'prometheus'):
+            raise ValueError("export_format must be 'jsonl' or 'prometheus'")
+
+        self.enabled = enabled
+        self.window = window
+        self.export_path = export_path
+        self.export_format = export_format
+        self.export_interval = export_interval
+        self.overlay = overlay
+
+        self.frames = 0
+        self.counters = {}
+        self.gauges = {}
+        self._stages = {}
+        self._timers = {}
+        self._frame_times = deque(maxlen=window)
+        self._started = time.time()
+        self._last_export = time.perf_counter()
+
+    def stage(self, name):
+        """Context manager timing one pipeline stage"""
+        if not self.enabled:
+            return _NULL_STAGE
+
+        timer = self._timers.get(name)
+        if timer is None:
+            samples = deque(maxlen=self.window)
+            self._stages[name] = samples
+            timer = self._timers[name] = _StageTimer(samples)
+        return timer
+
+    def record(self, name, seconds):
+        """Add a duration measured elsewhere"""
+        if self.enabled:
+            self.stage(name).samples.append(seconds)
+
+    def set_counter(self, name, value):
+        """Set a monotonically growing counter such as dropped frames"""
+        if self.enabled:
+            self.counters[name] = value
+
+    def increment(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        """Set a value that can go down as well as up, such as the quality level"""
+        if self.enabled:
+            self.gauges[name] = value
+
+    def frame_done(self):
+        """Mark the end of a frame; exports when the interval has passed"""
+        if not self.enabled:
+            return
+
+        now = time.perf_counter()
+        self.frames += 1
+        self._frame_times.append(now)
+
+        if self.export_path and now - self._last_export >= self.export_interval:
+            self._last_export = now
+            self.export()
+
+    def fps(self):
+        """Frames per second over the rolling window"""
+        if len(self._frame_times) < 2:
+            return 0.0
+        span = self._frame_times[-1] - self._frame_times[0]
+        return (len(self._frame_times) - 1) / span if span > 0 else 0.0
+
+    def snapshot(self):
+        """Current FPS, counters, gauges and p50/p95/p99 latency (ms) per stage"""
+        stages = {}
+        for name, samples in self._stages.items():
+            if not samples:
+                continue
+            values = np.fromiter(samples, np.float64, len(samples)) * 1000
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            stages[name] = {
+                'p50_ms': round(float(p50), 4),
+                'p95_ms': round(float(p95), 4),
+                'p99_ms': round(float(p99), 4),
+                'mean_ms': round(float(values.mean()), 4),
+                'count': len(values),
+            }
+        return {
+            'timestamp': time.time(),
+            'uptime_s': round(time.time() - self._started, 3),
+            'frames': self.frames,
+            'fps': round(self.fps(), 2),
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+            'stages': stages,
+        }
+
+    def export(self):
+        """Write a snapshot to the export file"""
+        if not self.export_path:
+            return
+        snapshot = self.snapshot()
+        try:
+            if self.export_format == 'jsonl':
+                with open(self.export_path, 'a') as f:
+                    f.write(json.dumps(snapshot) + '\n')
+            else:
+                # Prometheus scrapers read the whole file; replace it atomically
+                tmp_path = f"{self.export_path}.tmp"
+                with open(tmp_path, 'w') as f:
+                    f.write(self.prometheus_text(snapshot))
+                os.replace(tmp_path, self.export_path)
+        except OSError as e:
+            print(f"Warning: could not export metrics: {e}")
+
+    @staticmethod
+    def prometheus_text(snapshot):
+        """Render a snapshot in the Prometheus text exposition format"""
+        lines = [
+            '# TYPE cloak_frames_total counter',
+            f"cloak_frames_total {snapshot['frames']}",
+            '# TYPE cloak_fps gauge',
+            f"cloak_fps {snapshot['fps']}",
+        ]
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'# TYPE cloak_{name}_total counter')
+            lines.append(f'cloak_{name}_total {value}')
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines.append(f'# TYPE cloak_{name} gauge')
+            lines.append(f'cloak_{name} {value}')
+        lines.append('# TYPE cloak_stage_latency_ms summary')
+        for name, stats in sorted(snapshot['stages'].items()):
+            for quantile, key in (('0.5', 'p50_ms'), ('0.95', 'p95_ms'), ('0.99', 'p99_ms')):
+                lines.append(f'cloak_stage_latency_ms{{stage="{name}",quantile="{quantile}"}} {stats[key]}')
+            lines.append(f'cloak_stage_latency_ms_count{{stage="{name}"}} {stats["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def draw_overlay(self, frame, origin=(10, 90)):
+        """Draw FPS and per-stage p50/p95 latency onto the frame"""
+        if not (self.enabled and self.overlay):
+            return frame
+
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        x, y = origin
+        cv2.putText(frame, f"FPS: {self.fps():.1f}", (x, y), font, 0.5, (0, 255, 255), 1)
+        for name, samples in self._stages.items():
+            if not samples:
+                continue
+            y += 18
+            values = np.fromiter(samples, np.float64, len(samples)) * 1000
+            p50, p95 = np.percentile(values, (50, 95))
+            cv2.putText(frame, f"{name}: {p50:.2f} / {p95:.2f} ms", (x, y), font, 0.45, (0, 255, 255), 1)
+        return frame
@@ -0,0 +1,121 @@
+"""
+Motion Gate for Invisibility Cloak
+Detects which parts of the frame changed so unchanged masks can be reused
+"""
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap change detector on a heavily downsampled frame.
+
+    Each frame is shrunk by `downscale` with area averaging and compared
+    per tile against a reference copy. A tile counts as changed when any
+    of its downsampled pixels differs by more than `threshold` in any
+    channel.
+    The reference of a tile is only refreshed when that tile is reported
+    as changed, so slow drift still adds up to a change instead of
+    slipping through frame by frame. Every `refresh_interval` frames a
+    full recompute is forced.
+
+    changed_regions() returns None when everything should be recomputed,
+    [] when nothing changed, or a list of (x, y, w, h) tile rectangles in
+    frame coordinates (horizontally adjacent tiles are merged).
+    """
+
+    def __init__(self, tile_size=64, downscale=8, threshold=8, full_fraction=0.5, refresh_interval=150):
+        if tile_size % downscale:
+            raise ValueError("tile_size must be a multiple of downscale")
+        self.tile_size = tile_size
+        self.downscale = downscale
+        self.threshold = threshold
+        self.full_fraction = full_fraction
+        self.refresh_interval = refresh_interval
+
+        self.frames_reused = 0
+        self.frames_partial = 0
+        self.frames_full = 0
+        self._reference = None
+        self._small = None
+        self._frames_since_refresh = 0
+
+    def reset(self):
+        """Force a full recompute on the next frame"""
+        self._reference = None
+
+    def _tiles(self, changed, channels):
+        """Per-tile "any value changed" grid from the (rows, columns * channels) change map"""
+        cell = self.tile_size // self.downscale
+        height, width = changed.shape[0], changed.shape[1] // channels
+        rows, cols = -(-height // cell), -(-width // cell)
+        padded = np.zeros((rows * cell, cols * cell * channels), bool)
+        padded[:height, :width * channels] = changed
+        return padded.reshape(rows, cell, cols, cell * channels).any(axis=(1, 3))
+
+    def changed_regions(self, frame, allow_tiles=True):
+        height, width = frame.shape[:2]
+        # Crop to a multiple of the downscale so every small pixel maps to one tile
+        small_height, small_width = height // self.downscale, width // self.downscale
+        cropped = frame[:small_height * self.downscale, :small_width * self.downscale]
+        small_shape = (small_height, small_width) + frame.shape[2:]
+
+        if self._small is None or self._small.shape != small_shape:
+            self._small = np.empty(small_shape, frame.dtype)
+            self._reference = None
+        small = cv2.resize(cropped, (small_width, small_height), dst=self._small, interpolation=cv2.INTER_AREA)
+
+        self._frames_since_refresh += 1
+        if self._reference is None or self._frames_since_refresh >= self.refresh_interval:
+            return self._full(small)
+
+        # Channels side by side: (rows, columns * channels)
+        channels = small.shape[2] if small.ndim == 3 else 1
+        difference = cv2.absdiff(small, self._reference).reshape(small_height, -1)
+        changed = difference > self.threshold
+        if not changed.any():
+            self.frames_reused += 1
+            return []
+
+        tiles = self._tiles(changed, channels)
+        if not allow_tiles or tiles.mean() > self.full_fraction:
+            return self._full(small)
+
+        # Only the recomputed tiles take the new frame as their reference
+        cell = self.tile_size // self.downscale
+        regions = []
+        for row, col_start, col_end in self._runs(tiles):
+            y0, x0 = row * cell, col_start * cell
+            self._reference[y0:y0 + cell, x0:col_end * cell] = small[y0:y0 + cell, x0:col_end * cell]
+
+            # Tiles on the last row/column also cover the cropped-off remainder
+            y = row * self.tile_size
+            x = col_start * self.tile_size
+            y1 = height if row == tiles.shape[0] - 1 else y + self.tile_size
+            x1 = width if col_end == tiles.shape[1] else col_end * self.tile_size
+            regions.append((x, y, x1 - x, y1 - y))
+
+        self.frames_partial += 1
+        return regions
+
+    @staticmethod
+    def _runs(tiles):
+        """(row, first column, end column) for each horizontal run of changed tiles"""
+        for row in range(tiles.shape[0]):
+            cols = np.flatnonzero(tiles[row])
+            if not len(cols):
+                continue
+            # Split wherever consecutive changed columns are not adjacent
+            breaks = np.flatnonzero(np.diff(cols) > 1) + 1
+            for run in np.split(cols, breaks):
+                yield row, int(run[0]), int(run[-1]) + 1
+
+    def _full(self, small):
+        if self._reference is None or self._reference.shape != small.shape:
+            self._reference = small.copy()
+        else:
+            np.copyto(self._reference, small)
+        self._frames_since_refresh = 0
+        self.frames_full += 1
+        return None
@@ -0,0 +1,229 @@
+"""
+Multi-Stream Runner for Invisibility Cloak
+Runs the cloak on several cameras or clips in one process on a shared worker pool
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import cv2
+
+from advanced_invisibility_cloak import InvisibilityCloak
+
+
+class Stream:
+    """One source with its own cloak (background, buffers, trackers) and frame counters"""
+
+    def __init__(self, name, cloak, output_path=None, max_frames=None):
+        self.name = name
+        self.cloak = cloak
+        self.output_path = output_path
+        self.max_frames = max_frames
+
+        self.frames = 0
+        self.busy_seconds = 0.0
+        self.started = None
+        self.finished = None
+        self.done = False
+        self.error = None
+        self.capture_buffer = None
+
+    def fps(self, now=None):
+        end = self.finished if self.finished is not None else (now or time.perf_counter())
+        elapsed = end - self.started if self.started is not None else 0.0
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+    def frame_ms(self):
+        """Average worker time per frame; FPS below 1000 / this means the stream waited for a worker"""
+        return 1000.0 * self.busy_seconds / self.frames if self.frames else 0.0
+
+
+class MultiStreamRunner:
+    """
+    Process N streams on one size-limited thread pool.
+
+    Each stream keeps its own InvisibilityCloak, so frames of one stream
+    are processed in order with at most one in flight; that is what lets
+    streams share the pool without locks. Whenever a worker frees up, the
+    scheduler hands it to the next idle stream in round-robin order, so a
+    fast clip cannot starve a slow camera even when there are fewer
+    workers than streams. OpenCV's own threading is switched off while
+    running (the pool is the parallelism) so N streams no longer mean N
+    times the cores in OpenCV threads. Capture happens on the worker as
+    part of each frame's task; OpenCV releases the GIL for decoding and
+    all the per-frame image work.
+    """
+
+    def __init__(self, sources, workers=None, cloak_options=None, output_paths=None, background_frames=30,
+                 max_frames=None, report_interval=5.0):
+        if not sources:
+            raise ValueError("At least one source is required")
+        if output_paths and len(output_paths) != len(sources):
+            raise ValueError("Give one output path per source")
+
+        self.workers = workers or min(len(sources), os.cpu_count() or 1)
+        self.background_frames = background_frames
+        self.report_interval = report_interval
+        cloak_options = cloak_options or {}
+
+        self.streams = []
+        for index, source in enumerate(sources):
+            cloak = InvisibilityCloak(source=source, **cloak_options)
+            cloak.headless = True
+            output_path = output_paths[index] if output_paths else None
+            self.streams.append(Stream(f"stream{index}", cloak, output_path, max_frames))
+
+        self._next = 0
+
+    def _open(self, stream):
+        cloak = stream.cloak
+        if not cloak.initialize_camera():
+            raise Exception(f"Could not open {cloak.source!r}")
+        cloak.prepare_headless(stream.output_path, self.background_frames)
+        if not cloak.threaded_capture:
+            stream.capture_buffer = cloak.pool.get('capture')
+
+    def _step(self, stream):
+        """One frame of one stream, run on a pool worker; False when the stream ended"""
+        start = time.perf_counter()
+        more = stream.cloak.render_next(stream.capture_buffer)
+        stream.busy_seconds += time.perf_counter() - start
+        if more:
+            stream.frames += 1
+        return more
+
+    def _pick(self, idle):
+        """Next idle stream after the one scheduled last (round robin)"""
+        count = len(self.streams)
+        for offset in range(count):
+            index = (self._next + offset) % count
+            if index in idle:
+                self._next = index + 1
+                return index
+        return None
+
+    def _finish(self, stream, error=None):
+        stream.done = True
+        stream.error = error
+        stream.finished = time.perf_counter()
+        stream.cloak.cleanup()
+
+    def report(self, final=False):
+        now = time.perf_counter()
+        parts = [f"{s.name}: {s.fps(now):.1f} FPS, {s.frame_ms():.1f} ms/frame ({s.frames} frames)"
+                 for s in self.streams]
+        print(("Final: " if final else "") + " | ".join(parts))
+
+    def run(self):
+        """Process every stream to its end (or Ctrl+C); returns True if none failed"""
+        threads = cv2.getNumThreads()
+        cv2.setNumThreads(1)
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='stream')
+        pending = {}
+
+        try:
+            # Open in parallel: background capture reads dozens of frames per stream
+            opening = {executor.submit(self._open, stream): stream for stream in self.streams}
+            for future, stream in opening.items():
+                try:
+                    future.result()
+                    stream.started = time.perf_counter()
+                except Exception as e:
+                    print(f"{stream.name}: {e}")
+                    self._finish(stream, e)
+
+            idle = {i for i, stream in enumerate(self.streams) if not stream.done}
+            print(f"Running {len(idle)} streams on {self.workers} workers")
+            last_report = time.perf_counter()
+
+            while idle or pending:
+                # Fill free workers, one frame per stream at a time
+                while idle and len(pending) < self.workers:
+                    index = self._pick(idle)
+                    idle.discard(index)
+                    pending[executor.submit(self._step, self.streams[index])] = index
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index = pending.pop(future)
+                    stream = self.streams[index]
+                    try:
+                        more = future.result()
+                    except Exception as e:
+                        print(f"{stream.name}: error: {e}")
+                        self._finish(stream, e)
+                        continue
+                    if more and (stream.max_frames is None or stream.frames < stream.max_frames):
+                        idle.add(index)
+                    else:
+                        self._finish(stream)
+
+                if self.report_interval and time.perf_counter() - last_report >= self.report_interval:
+                    self.report()
+                    last_report = time.perf_counter()
+
+        except KeyboardInterrupt:
+            print("\nInterrupted by user")
+            # Let the frames in flight finish before tearing their streams down
+            wait(pending)
+            for stream in self.streams:
+                if not stream.done:
+                    self._finish(stream)
+        finally:
+            executor.shutdown(wait=True)
+            cv2.setNumThreads(threads)
+
+        self.report(final=True)
+        return all(stream.error is None for stream in self.streams)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the invisibility cloak on several cameras or clips at once')
+    parser.add_argument('sources', nargs='+',
+                        help='Camera indexes, video files, image directories or raw:<path> streams')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker threads shared by all streams (default: one per stream, up to the CPU count)')
+    parser.add_argument('--outputs', nargs='+', default=None, help='One output video per source')
+    parser.add_argument('--background-frames', type=int, default=30,
+                        help='Leading frames of each source used as its background (default: 30)')
+    parser.add_argument('--max-frames', type=int, default=None, help='Stop each stream after this many frames')
+    parser.add_argument('--report-interval', type=float, default=5.0,
+                        help='Seconds between per-stream FPS reports, 0 for the final one only (default: 5)')
+    parser.add_argument('--width', type=int, default=640, help='Camera width (default: 640)')
+    parser.add_argument('--height', type=int, default=480, help='Camera height (default: 480)')
+    parser.add_argument('--lut', action='store_true', help='Use a precomputed BGR lookup table for color detection')
+    parser.add_argument('--roi', action='store_true', help='Track the cloak and only process the region around it')
+    parser.add_argument('--mask-scale', type=float, default=1.0, help='Compute the mask at this fraction of the resolution (default: 1.0)')
+    parser.add_argument('--motion-gate', action='store_true', help='Reuse the previous mask where the scene did not change')
+    parser.add_argument('--color-config', type=str, default=None, help='JSON color ranges written by hsv_tuner.py')
+    parser.add_argument('--fast-start', action='store_true',
+                        help='Take each background as soon as its camera settles instead of a fixed frame count')
+    args = parser.parse_args()
+
+    cloak_options = {
+        'width': args.width,
+        'height': args.height,
+        'use_lut': args.lut,
+        'roi_tracking': args.roi,
+        'mask_scale': args.mask_scale,
+        'motion_gate': args.motion_gate,
+        'color_config': args.color_config,
+        'fast_start': args.fast_start,
+    }
+
+    try:
+        runner = MultiStreamRunner(args.sources, args.workers, cloak_options, args.outputs, args.background_frames,
+                                   args.max_frames, args.report_interval)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if not runner.run():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Offline Renderer for Invisibility Cloak
+Renders recorded footage with the cloak effect across a process pool
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from advanced_invisibility_cloak import InvisibilityCloak
+from background_model import BackgroundModel
+from frame_buffers import FramePool
+from frame_sources import open_frame_source
+from video_output import open_video_writer
+
+# Per-process state set up by _init_worker
+_worker = {}
+
+
+def _segment_views(buffer, slots, segment_frames, frame_shape):
+    """Map the shared block as (slots, frames, H, W, 3) plus the background"""
+    frame_bytes = int(np.prod(frame_shape))
+    segments = np.ndarray((slots, segment_frames) + frame_shape, np.uint8, buffer=buffer)
+    background = np.ndarray(frame_shape, np.uint8, buffer=buffer,
+                            offset=slots * segment_frames * frame_bytes)
+    return segments, background
+
+
+def _init_worker(shm_name, slots, segment_frames, frame_shape, cloak_options):
+    """Attach to the shared frame block and build this process's cloak"""
+    # One OpenCV thread per process; the pool provides the parallelism
+    cv2.setNumThreads(1)
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    segments, background = _segment_views(shm.buf, slots, segment_frames, frame_shape)
+
+    cloak = InvisibilityCloak(width=frame_shape[1], height=frame_shape[0], **cloak_options)
+    cloak.pool = FramePool(frame_shape[1], frame_shape[0])
+    cloak.background = background
+
+    _worker['shm'] = shm
+    _worker['segments'] = segments
+    _worker['cloak'] = cloak
+
+
+def _render_segment(slot, count):
+    """Mask and composite a segment of frames in place in shared memory"""
+    cloak = _worker['cloak']
+    frames = _worker['segments'][slot]
+
+    for i in range(count):
+        frame = frames[i]
+        mask = cloak.compute_mask(frame)
+        cloak.apply_invisibility_effect(frame, mask, dst=frame)
+
+    return slot, count
+
+
+def render_video(input_source, output_path, workers=None, segment_frames=16, background_frames=30,
+                 background_path=None, mirror=False, cloak_options=None):
+    """
+    Render input_source to output_path with the cloak effect.
+
+    The main process decodes frames straight into a shared-memory ring of
+    segment slots; workers composite each segment in place and the main
+    process writes segments back out in submission order. Returns
+    (frames rendered, wall time in seconds).
+    """
+    workers = workers or os.cpu_count() or 1
+    cloak_options = cloak_options or {}
+    start_time = time.perf_counter()
+
+    cap = open_frame_source(input_source)
+    if not cap.isOpened():
+        raise Exception(f"Could not open input {input_source!r}")
+
+    def read_frame(dst=None):
+        ret, frame = cap.read()
+        if not ret:
+            return None
+        if mirror:
+            return cv2.flip(frame, 1, dst=dst)
+        if dst is not None:
+            dst[...] = frame
+            return dst
+        return frame
+
+    # Background from a still image, or from the median of the leading frames
+    lead_frames = []
+    if background_path:
+        background_image = cv2.imread(background_path)
+        if background_image is None:
+            raise Exception(f"Could not read background image {background_path}")
+        first = read_frame()
+        if first is not None:
+            lead_frames.append(first)
+    else:
+        model = BackgroundModel('median')
+        while len(lead_frames) < max(1, background_frames):
+            frame = read_frame()
+            if frame is None:
+                break
+            lead_frames.append(frame)
+            model.add(frame)
+        if lead_frames:
+            background_image = model.finalize()
+
+    if not lead_frames:
+        cap.release()
+        raise Exception(f"No frames read from {input_source!r}")
+
+    frame_shape = lead_frames[0].shape
+    height, width = frame_shape[:2]
+    if background_image.shape != frame_shape:
+        background_image = cv2.resize(background_image, (width, height))
+
+    # Two segments in flight per worker keeps everyone busy while we decode
+    slots = workers * 2
+    frame_bytes = int(np.prod(frame_shape))
+    shm = shared_memory.SharedMemory(create=True, size=(slots * segment_frames + 1) * frame_bytes)
+    writer = None
+    frames_written = 0
+
+    try:
+        segments, background = _segment_views(shm.buf, slots, segment_frames, frame_shape)
+        background[...] = background_image
+
+        writer = open_video_writer(output_path, cap.get(cv2.CAP_PROP_FPS), (width, height))
+        free_slots = deque(range(slots))
+        pending = deque()
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, slots, segment_frames, frame_shape, cloak_options)) as executor:
+            exhausted = False
+            while not exhausted or pending:
+                # Fill every free slot with the next segment of frames
+                while free_slots and not exhausted:
+                    slot = free_slots.popleft()
+                    count = 0
+                    while count < segment_frames:
+                        if lead_frames:
+                            segments[slot, count] = lead_frames.pop(0)
+                        elif read_frame(segments[slot, count]) is None:
+                            exhausted = True
+                            break
+                        count += 1
+                    if count == 0:
+                        free_slots.append(slot)
+                        break
+                    pending.append(executor.submit(_render_segment, slot, count))
+
+                if not pending:
+                    break
+
+                # Always wait on the oldest segment so output stays in order
+                slot, count = pending.popleft().result()
+                for i in range(count):
+                    writer.write(segments[slot, i])
+                frames_written += count
+                free_slots.append(slot)
+
+        del segments, background
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+        shm.close()
+        shm.unlink()
+
+    return frames_written, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render recorded footage with the invisibility cloak effect')
+    parser.add_argument('input', help='Input video file, image directory or raw:<path> stream')
+    parser.add_argument('output', help='Output video file (.mp4, .avi, ...)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--segment-frames', type=int, default=16, help='Frames per work item (default: 16)')
+    parser.add_argument('--background', type=str, default=None, help='Background image (default: median of the first frames)')
+    parser.add_argument('--background-frames', type=int, default=30, help='Leading frames used for the background (default: 30)')
+    parser.add_argument('--mirror', action='store_true', help='Flip frames horizontally like the live view')
+    parser.add_argument('--lut', action='store_true', help='Use the precomputed BGR lookup table for color detection')
+    parser.add_argument('--mask-scale', type=float, default=1.0, help='Compute the mask at this fraction of the resolution (default: 1.0)')
+    args = parser.parse_args()
+
+    cloak_options = {'use_lut': args.lut, 'mask_scale': args.mask_scale}
+
+    try:
+        frames, elapsed = render_video(args.input, args.output, args.workers, args.segment_frames,
+                                       args.background_frames, args.background, args.mirror, cloak_options)
+    except Exception as e:
+        print(f"Render failed: {e}")
+        sys.exit(1)
+
+    fps = frames / elapsed if elapsed > 0 else 0.0
+    print(f"Rendered {frames} frames in {elapsed:.2f}s ({fps:.1f} FPS)")
+
+
+if __name__ == "__main__":
+    main()
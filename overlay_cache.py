@@ -0,0 +1,92 @@
+"""
+Overlay Cache for Invisibility Cloak
+Static text blocks rendered once into sprites and blitted each frame
+"""
+
+import cv2
+import numpy as np
+
+
+class TextSprite:
+    """
+    A block of cv2.putText lines pre-rendered into a small image and alpha matte.
+
+    Lines are (text, origin, font, scale, color, thickness) tuples using
+    the same arguments as cv2.putText. The sprite keeps the text color
+    premultiplied by coverage plus an 8-bit alpha matte, and blitting
+    blends frame * (1 - alpha) + color. With aliased text (OpenCV 4) the
+    alpha is 0/255 and the result matches putText exactly; with the
+    anti-aliased renderer of newer OpenCV it matches to within rounding.
+    """
+
+    def __init__(self, lines):
+        self.lines = tuple(lines)
+
+        # Bounding box of all lines, padded for stroke thickness
+        x0 = y0 = np.inf
+        x1 = y1 = -np.inf
+        for text, (x, y), font, scale, color, thickness in self.lines:
+            (width, height), baseline = cv2.getTextSize(text, font, scale, thickness)
+            pad = thickness + 2
+            x0 = min(x0, x - pad)
+            y0 = min(y0, y - height - pad)
+            x1 = max(x1, x + width + pad)
+            y1 = max(y1, y + baseline + pad)
+
+        self.x = int(x0)
+        self.y = int(y0)
+        width = int(x1) - self.x
+        height = int(y1) - self.y
+
+        self.image = np.zeros((height, width, 3), np.uint8)
+        self.alpha = np.zeros((height, width), np.uint8)
+        for text, (x, y), font, scale, color, thickness in self.lines:
+            origin = (x - self.x, y - self.y)
+            # Drawing on black gives color * coverage, i.e. premultiplied color
+            cv2.putText(self.image, text, origin, font, scale, color, thickness)
+            cv2.putText(self.alpha, text, origin, font, scale, 255, thickness)
+
+        self.inverse_alpha = cv2.cvtColor(255 - self.alpha, cv2.COLOR_GRAY2BGR)
+
+    def blit(self, frame):
+        """Blend the text into the frame, clipped to its bounds"""
+        frame_height, frame_width = frame.shape[:2]
+        height, width = self.alpha.shape
+
+        # Visible part of the sprite in frame coordinates
+        left = max(self.x, 0)
+        top = max(self.y, 0)
+        right = min(self.x + width, frame_width)
+        bottom = min(self.y + height, frame_height)
+        if left >= right or top >= bottom:
+            return frame
+
+        sx, sy = left - self.x, top - self.y
+        sw, sh = right - left, bottom - top
+        roi = frame[top:bottom, left:right]
+
+        # roi * (1 - alpha) + premultiplied color, only over the sprite's box
+        kept = cv2.multiply(roi, self.inverse_alpha[sy:sy + sh, sx:sx + sw], scale=1 / 255.0)
+        cv2.add(kept, self.image[sy:sy + sh, sx:sx + sw], dst=roi)
+        return frame
+
+
+class OverlayCache:
+    """Keeps one sprite per key and re-renders it only when its lines change"""
+
+    def __init__(self):
+        self._sprites = {}
+        self.renders = 0
+
+    def draw(self, frame, key, lines):
+        """Draw a text block onto the frame, rendering its sprite if needed"""
+        lines = tuple(lines)
+        sprite = self._sprites.get(key)
+        if sprite is None or sprite.lines != lines:
+            sprite = TextSprite(lines)
+            self._sprites[key] = sprite
+            self.renders += 1
+        return sprite.blit(frame)
+
+    def clear(self):
+        self._sprites.clear()
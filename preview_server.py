@@ -0,0 +1,160 @@
+"""
+Preview Server for Invisibility Cloak
+Streams the output to browsers on other machines as MJPEG over HTTP
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from async_writer import BackgroundWriter
+
+BOUNDARY = b'cloakframe'
+
+INDEX_PAGE = b"""<!DOCTYPE html>
+<html><head><title>Invisibility Cloak</title></head>
+<body style="margin:0;background:#000"><img src="/stream.mjpg" style="width:100%"></body></html>
+"""
+
+
+class PreviewServer(BackgroundWriter):
+    """
+    MJPEG preview of the output stream.
+
+    publish() hands the frame to a single encoder thread through a
+    one-slot queue; if the encoder is still busy with the previous frame,
+    the new one is dropped (counted in `preview_dropped`), so the frame
+    loop never waits for JPEG encoding. Every encoded frame is stored
+    once as bytes with a sequence number, and each client thread sends
+    whatever is newest when it is ready for the next frame. A slow client
+    therefore skips frames on its own without holding up the encoder or
+    the other clients.
+
+    Endpoints: / (viewer page), /stream.mjpg (multipart MJPEG stream)
+    and /snapshot.jpg (latest frame).
+    """
+
+    def __init__(self, host='0.0.0.0', port=8080, quality=80, metrics=None):
+        self.quality = quality
+        self.frames_encoded = 0
+        self.clients = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+
+        self._jpeg = None
+        self._sequence = 0
+        self._closed = False
+        self._frame_ready = threading.Condition()
+
+        # Bind before starting any thread so a busy port fails immediately
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.address = self.httpd.server_address[:2]
+        super().__init__('preview', 1, 1, 'drop', metrics)
+
+        self._server_thread = threading.Thread(target=self.httpd.serve_forever, name='preview-http', daemon=True)
+        self._server_thread.start()
+
+    @property
+    def url(self):
+        host, port = self.address
+        return f"http://{'localhost' if host == '0.0.0.0' else host}:{port}/"
+
+    def publish(self, frame):
+        """Queue frame for encoding; returns False if the encoder was busy and it was skipped"""
+        return self.submit(frame)
+
+    def _write(self, frame):
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise Exception("JPEG encoding failed")
+        with self._frame_ready:
+            self._jpeg = encoded.tobytes()
+            self._sequence += 1
+            self.frames_encoded += 1
+            self._frame_ready.notify_all()
+
+    def latest(self, after=0, timeout=None):
+        """(sequence, jpeg bytes) of the newest frame past `after`; waits for one, None once closed"""
+        with self._frame_ready:
+            if not self._frame_ready.wait_for(lambda: self._sequence > after or self._closed, timeout):
+                return None
+            if self._closed:
+                return None
+            return self._sequence, self._jpeg
+
+    def close(self):
+        """Stop encoding, disconnect the clients and shut the HTTP server down"""
+        super().close()
+        with self._frame_ready:
+            self._closed = True
+            self._frame_ready.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(encoded=self.frames_encoded, clients=self.clients,
+                     sent=self.frames_sent, skipped=self.frames_skipped)
+        return stats
+
+    def _handler_class(self):
+        server = self
+
+        class PreviewHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path in ('/', '/index.html'):
+                    self._send_body('text/html', INDEX_PAGE)
+                elif path == '/snapshot.jpg':
+                    latest = server.latest(timeout=5.0)
+                    if latest is None:
+                        self.send_error(503, 'No frame yet')
+                    else:
+                        self._send_body('image/jpeg', latest[1])
+                elif path == '/stream.mjpg':
+                    self._stream()
+                else:
+                    self.send_error(404)
+
+            def _send_body(self, content_type, body):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header('Content-Type', f"multipart/x-mixed-replace; boundary={BOUNDARY.decode()}")
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+
+                with server._frame_ready:
+                    server.clients += 1
+                sequence = 0
+                try:
+                    while True:
+                        latest = server.latest(sequence)
+                        if latest is None:
+                            return
+                        with server._frame_ready:
+                            if sequence:
+                                # Frames encoded while this client was still sending the last one
+                                server.frames_skipped += latest[0] - sequence - 1
+                            server.frames_sent += 1
+                        sequence, jpeg = latest
+                        self.wfile.write(b'--' + BOUNDARY + b'\r\nContent-Type: image/jpeg\r\n'
+                                         + f"Content-Length: {len(jpeg)}\r\n\r\n".encode() + jpeg + b'\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with server._frame_ready:
+                        server.clients -= 1
+
+        return PreviewHandler
@@ -0,0 +1,90 @@
+"""
+Quality Governor for Invisibility Cloak
+Steps pipeline quality up or down to hold a target frame rate
+"""
+
+from collections import deque
+
+import numpy as np
+
+# Best first. ROI tracking costs almost nothing in quality, so it goes first;
+# the mask resolution is the last thing given up.
+QUALITY_LEVELS = (
+    {'mask_scale': 1.0, 'dilate_iterations': 2, 'median_blur': True, 'roi_tracking': False},
+    {'mask_scale': 1.0, 'dilate_iterations': 2, 'median_blur': True, 'roi_tracking': True},
+    {'mask_scale': 1.0, 'dilate_iterations': 2, 'median_blur': False, 'roi_tracking': True},
+    {'mask_scale': 1.0, 'dilate_iterations': 1, 'median_blur': False, 'roi_tracking': True},
+    {'mask_scale': 0.5, 'dilate_iterations': 1, 'median_blur': False, 'roi_tracking': True},
+    {'mask_scale': 0.25, 'dilate_iterations': 1, 'median_blur': False, 'roi_tracking': True},
+)
+
+
+class QualityGovernor:
+    """
+    Pick the best quality level whose frame time fits the budget.
+
+    Frame times are collected over a window of `window` frames. If their
+    median is over budget (1 / target_fps) the governor drops one level;
+    if it is under `raise_below` of the budget it tries one level up.
+    The gap between the two thresholds, a fresh window after every change
+    and a back-off before retrying a level that was just abandoned keep it
+    from oscillating between two neighbours. The back-off starts at
+    `hold_windows` windows and doubles each time a retried level fails
+    again straight away (up to `max_hold_windows`).
+    """
+
+    def __init__(self, target_fps=30.0, levels=QUALITY_LEVELS, window=30, raise_below=0.7,
+                 hold_windows=4, max_hold_windows=64, start_level=0):
+        if target_fps <= 0:
+            raise ValueError("target_fps must be positive")
+        if not 0.0 < raise_below < 1.0:
+            raise ValueError("raise_below must be in (0, 1)")
+
+        self.target_fps = target_fps
+        self.budget = 1.0 / target_fps
+        self.levels = levels
+        self.raise_below = raise_below
+        self.hold_windows = hold_windows
+        self.max_hold_windows = max_hold_windows
+
+        self.level = min(max(0, start_level), len(levels) - 1)
+        self.changes = 0
+        self._samples = deque(maxlen=window)
+        # Windows to wait before trying to go back up to a level we left
+        self._hold = 0
+        self._backoff = hold_windows
+        self._just_raised = False
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def update(self, frame_seconds):
+        """Add one frame time; returns the new settings if the level changed, else None"""
+        self._samples.append(frame_seconds)
+        if len(self._samples) < self._samples.maxlen:
+            return None
+
+        median = float(np.median(self._samples))
+        self._samples.clear()
+        just_raised, self._just_raised = self._just_raised, False
+
+        if median > self.budget and self.level < len(self.levels) - 1:
+            self.level += 1
+            if just_raised:
+                # The retried level failed at once: wait longer next time
+                self._backoff = min(self._backoff * 2, self.max_hold_windows)
+            else:
+                self._backoff = self.hold_windows
+            self._hold = self._backoff
+        elif median < self.budget * self.raise_below and self.level > 0:
+            if self._hold > 0:
+                self._hold -= 1
+                return None
+            self.level -= 1
+            self._just_raised = True
+        else:
+            return None
+
+        self.changes += 1
+        return self.settings
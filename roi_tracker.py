@@ -0,0 +1,69 @@
+"""
+ROI Tracker for Invisibility Cloak
+Restricts mask computation to the area around the cloak's last position
+"""
+
+import cv2
+
+
+class ROITracker:
+    """
+    Track the cloak's bounding box between frames.
+
+    next_region() returns the area to process for the coming frame: the
+    previous bounding box grown by a motion margin, or the full frame
+    every rescan_interval frames and whenever the cloak was lost.
+    Regions are (x, y, w, h) tuples in frame coordinates.
+    """
+
+    def __init__(self, margin=32, rescan_interval=30):
+        self.margin = margin
+        self.rescan_interval = rescan_interval
+
+        self.roi = None
+        self.frames_since_rescan = 0
+        self.full_scans = 0
+        self.roi_scans = 0
+
+    def reset(self):
+        """Force a full-frame scan on the next frame"""
+        self.roi = None
+
+    def next_region(self, frame_shape):
+        height, width = frame_shape[:2]
+
+        if self.roi is None or self.frames_since_rescan >= self.rescan_interval:
+            self.frames_since_rescan = 0
+            self.full_scans += 1
+            return (0, 0, width, height)
+
+        self.frames_since_rescan += 1
+        self.roi_scans += 1
+
+        # Grow the last bounding box by the motion margin, clamped to the frame
+        x, y, w, h = self.roi
+        x0 = max(0, x - self.margin)
+        y0 = max(0, y - self.margin)
+        x1 = min(width, x + w + self.margin)
+        y1 = min(height, y + h + self.margin)
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def update(self, region_mask, region):
+        """
+        Record the cloak's bounding box from the mask of the processed region.
+
+        Returns the box in frame coordinates, or None if the region was empty.
+        """
+        x, y, w, h = cv2.boundingRect(region_mask)
+        if w == 0 or h == 0:
+            self.roi = None
+            return None
+
+        self.roi = (region[0] + x, region[1] + y, w, h)
+        return self.roi
+
+    def coverage(self, frame_shape):
+        """Fraction of the frame inside the current tracked box"""
+        if self.roi is None:
+            return 0.0
+        return (self.roi[2] * self.roi[3]) / float(frame_shape[0] * frame_shape[1])
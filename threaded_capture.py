@@ -0,0 +1,140 @@
+"""
+Threaded Capture for Invisibility Cloak
+Background producer thread that fills a preallocated ring of frame buffers
+"""
+
+import threading
+
+import numpy as np
+
+from frame_sources import FrameSource
+
+
+class ThreadedCapture(FrameSource):
+    """
+    Wrap a frame source so that capture I/O overlaps with processing.
+
+    A producer thread reads into a fixed ring of preallocated buffers.
+    read() always hands out the newest complete frame; with the
+    drop-oldest policy, frames the consumer never picked up are counted
+    in frames_dropped instead of queueing up as latency.
+
+    The array returned by read() stays valid until the next read() call.
+    """
+
+    def __init__(self, source, buffer_count=4, drop_oldest=None):
+        super().__init__()
+        if buffer_count < 3:
+            raise ValueError("buffer_count must be at least 3 (latest, reading, writing)")
+
+        self.source = source
+        self.width = source.width
+        self.height = source.height
+        self.fps = source.fps
+        self.buffer_count = buffer_count
+        # Live cameras drop stale frames; files block so no frame is lost
+        self.drop_oldest = source.is_live if drop_oldest is None else drop_oldest
+
+        self.buffers = [None] * buffer_count
+        if self.width and self.height:
+            for i in range(buffer_count):
+                self.buffers[i] = np.empty((self.height, self.width, 3), np.uint8)
+
+        self.frames_captured = 0
+        self.frames_delivered = 0
+        self.frames_dropped = 0
+
+        self._condition = threading.Condition()
+        self._latest = None
+        self._reading = None
+        self._sequence = 0
+        self._consumed = 0
+        self._running = True
+        self._finished = False
+
+        self._thread = threading.Thread(target=self._produce, name="ThreadedCapture", daemon=True)
+        self._thread.start()
+
+    def _next_slot(self):
+        """Pick a buffer that is neither the newest frame nor held by the consumer"""
+        for i in range(self.buffer_count):
+            if i != self._latest and i != self._reading:
+                return i
+        return None
+
+    def _produce(self):
+        try:
+            while self._running:
+                with self._condition:
+                    if not self.drop_oldest:
+                        # Blocking policy: wait until the last frame was taken
+                        while self._running and self._sequence > self._consumed:
+                            self._condition.wait()
+                    slot = self._next_slot()
+                if not self._running:
+                    break
+
+                ret, frame = self.source.read(self.buffers[slot])
+                if not ret:
+                    break
+
+                with self._condition:
+                    # The source may have (re)allocated, e.g. on first frame
+                    self.buffers[slot] = frame
+                    if self._sequence > self._consumed:
+                        self.frames_dropped += 1
+                    self._latest = slot
+                    self._sequence += 1
+                    self.frames_captured += 1
+                    self._condition.notify_all()
+        finally:
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+    def isOpened(self):
+        return self.source.isOpened()
+
+    def read(self, image=None):
+        with self._condition:
+            while self._sequence == self._consumed and not self._finished:
+                self._condition.wait()
+            if self._sequence == self._consumed:
+                return False, None
+
+            self._reading = self._latest
+            self._consumed = self._sequence
+            self.frames_delivered += 1
+            self._condition.notify_all()
+            frame = self.buffers[self._reading]
+
+        if image is not None and image.shape == frame.shape:
+            image[...] = frame
+            return True, image
+        return True, frame
+
+    def get(self, prop):
+        return self.source.get(prop)
+
+    def set(self, prop, value):
+        return self.source.set(prop, value)
+
+    def stats(self):
+        """Return capture counters as a dictionary"""
+        with self._condition:
+            return {
+                'captured': self.frames_captured,
+                'delivered': self.frames_delivered,
+                'dropped': self.frames_dropped,
+            }
+
+    def release(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join(timeout=2.0)
+        self.source.release()
+
+    @property
+    def is_live(self):
+        return self.source.is_live
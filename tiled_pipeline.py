@@ -0,0 +1,171 @@
+"""
+Tiled Pipeline for Invisibility Cloak
+Runs mirror, mask, cleanup and compositing on horizontal strips in parallel
+"""
+
+import copy
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from compositor import FeatherCompositor
+from frame_buffers import FramePool
+
+
+class TiledPipeline:
+    """
+    Cut each frame into horizontal strips and process them on a thread pool.
+
+    Every strip runs the whole chain (mirror, color mask, cleanup,
+    composite) for its rows. It reads `halo` extra rows above and below,
+    enough for every neighbourhood operation to see the same pixels it
+    would see on the full frame. The halo covers the 3x3 erosion, the
+    (2n + 3) dilation, the 5x5 median and the feather blur. Rows are
+    independent in the mirror, so each strip mirrors its own rows
+    straight from the captured frame and no strip waits for another. The
+    result is bit-exact with the untiled pipeline. OpenCV releases the GIL
+    in all of these calls, so the strips really run in parallel.
+
+    Each strip has its own copy of the cloak with a private buffer pool,
+    color table scratch and compositor, so nothing is shared between
+    threads except the frames they read and the rows they own. With the
+    adaptive background, the background update has to see the whole mask
+    before anything is composited, so the strips then run in two passes.
+
+    Only full-resolution, untracked and ungated masks are tiled. With
+    mask scaling, ROI tracking or the motion gate active (including when
+    the quality governor switches them on), frames take the normal path.
+    """
+
+    # Cloak settings that may change between frames (quality governor, recapture)
+    SYNCED = ('background', 'dilate_iterations', 'median_blur', 'refine_method')
+
+    def __init__(self, cloak, strips=None, workers=None):
+        self.cloak = cloak
+        self.workers = workers or os.cpu_count() or 1
+        self.strips = strips or self.workers
+        if self.strips < 1:
+            raise ValueError("strips must be >= 1")
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='tile')
+        self._shape = None
+        self._bounds = []
+        self._strip_cloaks = []
+
+    def applies(self):
+        """Whether the cloak's current settings can run tiled"""
+        cloak = self.cloak
+        return cloak.mask_scale == 1.0 and cloak.roi_tracker is None and cloak.motion_gate is None
+
+    def halo(self):
+        """Rows of context each strip needs on both sides"""
+        cloak = self.cloak
+        # Erosion 1 + dilation n + 1, then the 5x5 median
+        halo = cloak.dilate_iterations + 2 + (2 if cloak.median_blur else 0)
+        if cloak.compositor is not None:
+            halo += cloak.compositor.radius
+        return halo
+
+    def _strip_cloak(self, width, rows):
+        """Copy of the cloak whose scratch state belongs to one strip"""
+        cloak = self.cloak
+        strip = copy.copy(cloak)
+        strip.pool = FramePool(width, rows)
+        strip._dilate_kernels = {}
+        if cloak.mask_lut is not None:
+            strip.mask_lut = cloak.mask_lut.thread_copy()
+        if cloak.labeler is not None:
+            strip.labeler = cloak.labeler.thread_copy()
+        if cloak.compositor is not None:
+            strip.compositor = FeatherCompositor(cloak.compositor.radius, cloak.compositor.strip_rows)
+        return strip
+
+    def _layout(self, shape):
+        height, width = shape[:2]
+        count = min(self.strips, height)
+        edges = [height * i // count for i in range(count + 1)]
+        self._bounds = list(zip(edges[:-1], edges[1:]))
+        # Room for the halo at the current settings; the pools grow if it does
+        rows = max(end - start for start, end in self._bounds) + 2 * self.halo()
+        self._strip_cloaks = [self._strip_cloak(width, rows) for _ in self._bounds]
+        self._shape = shape
+
+    def process(self, captured, keep_original=False):
+        """Mirror, mask and composite one captured frame; returns (frame, result, mask) like process_frame"""
+        cloak = self.cloak
+        if self._shape != captured.shape:
+            self._layout(captured.shape)
+        for strip in self._strip_cloaks:
+            for name in self.SYNCED:
+                setattr(strip, name, getattr(cloak, name))
+
+        frame = cloak.pool.get('frame', captured.shape)
+        output = cloak.pool.get('output', captured.shape) if keep_original else frame
+        mask = cloak.pool.get('mask', captured.shape[:2])
+        halo = self.halo()
+
+        if cloak.adaptive_background:
+            self._run(self._mask_strip, captured, frame, mask, halo)
+            cloak.background_model.update(frame, mask)
+            self._run(self._composite_strip, frame, output, mask)
+        else:
+            self._run(self._strip, captured, frame, output, mask, halo)
+        return frame, output, mask
+
+    def _run(self, fn, *args):
+        futures = [self._executor.submit(fn, index, *args) for index in range(len(self._bounds))]
+        for future in futures:
+            # Re-raise strip errors on the caller's thread
+            future.result()
+
+    def _mirror_and_mask(self, index, captured, frame, mask, halo):
+        """Mirror the strip's rows plus halo and build their mask; returns (strip mask, first row)"""
+        strip = self._strip_cloaks[index]
+        top, bottom = self._bounds[index]
+        height, width = captured.shape[:2]
+        first, last = max(0, top - halo), min(height, bottom + halo)
+
+        # A horizontal flip keeps rows where they are
+        mirrored = cv2.flip(captured[first:last], 1, dst=strip.pool.get('frame', (last - first, width, 3)))
+        np.copyto(frame[top:bottom], mirrored[top - first:bottom - first])
+
+        strip_mask = strip.compute_mask_native(mirrored, dst=strip.pool.get('mask', (last - first, width)))
+        np.copyto(mask[top:bottom], strip_mask[top - first:bottom - first])
+        return strip_mask, first
+
+    def _composite(self, index, frame, output, mask, mask_first):
+        """Composite the strip's rows; mask starts at frame row mask_first"""
+        strip = self._strip_cloaks[index]
+        top, bottom = self._bounds[index]
+        rows = output[top:bottom]
+        if output is not frame:
+            np.copyto(rows, frame[top:bottom])
+        background = strip.background[top:bottom]
+
+        compositor = strip.compositor
+        if compositor is None:
+            cv2.copyTo(background, mask[top - mask_first:bottom - mask_first], rows)
+            return
+
+        # The matte needs `radius` rows of mask beyond the strip on both sides
+        radius = compositor.radius
+        first = max(0, top - radius)
+        last = min(frame.shape[0], bottom + radius)
+        alpha = compositor.alpha_matte(mask[first - mask_first:last - mask_first],
+                                       dst=strip.pool.get('alpha', (last - first, frame.shape[1])))
+        compositor.blend(rows, background, alpha[top - first:bottom - first], rows)
+
+    def _strip(self, index, captured, frame, output, mask, halo):
+        strip_mask, first = self._mirror_and_mask(index, captured, frame, mask, halo)
+        self._composite(index, frame, output, strip_mask, first)
+
+    def _mask_strip(self, index, captured, frame, mask, halo):
+        self._mirror_and_mask(index, captured, frame, mask, halo)
+
+    def _composite_strip(self, index, frame, output, mask):
+        self._composite(index, frame, output, mask, 0)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
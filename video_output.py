@@ -0,0 +1,44 @@
+"""
+Video Output for Invisibility Cloak
+Helpers for writing rendered frames to video files
+"""
+
+import os
+
+import cv2
+
+from frame_recording import RECORDING_EXTENSION, RawFrameWriter
+
+# FourCC codes that ship with the stock opencv-python wheels
+FOURCC_BY_EXTENSION = {
+    '.mp4': 'mp4v',
+    '.m4v': 'mp4v',
+    '.mov': 'mp4v',
+    '.avi': 'MJPG',
+    '.mkv': 'XVID',
+}
+
+
+def open_video_writer(path, fps, frame_size, fourcc=None):
+    """
+    Open a cv2.VideoWriter for path, picking a codec from the extension.
+
+    frame_size is (width, height). Raises an Exception if the writer
+    cannot be opened, so callers fail before rendering anything.
+    .cloakraw paths get an uncompressed RawFrameWriter instead.
+    """
+    if path.lower().endswith(RECORDING_EXTENSION):
+        return RawFrameWriter(path, fps, frame_size)
+
+    if fourcc is None:
+        extension = os.path.splitext(path)[1].lower()
+        fourcc = FOURCC_BY_EXTENSION.get(extension, 'mp4v')
+
+    if not fps or fps <= 0 or fps > 1000:
+        # Image sequences and some containers report no usable rate
+        fps = 30.0
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, frame_size)
+    if not writer.isOpened():
+        raise Exception(f"Could not open video writer for {path} ({fourcc})")
+    return writer
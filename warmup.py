@@ -0,0 +1,98 @@
+"""
+Camera Warmup for Invisibility Cloak
+Ends background capture as soon as exposure and white balance settle
+"""
+
+import time
+
+import cv2
+
+
+class WarmupMonitor:
+    """
+    Watches the drift of the picture while a camera settles.
+
+    Each frame is shrunk by `downscale` (area averaging, which also
+    averages out most sensor noise) and compared with the first frame of
+    the current stable run, not just the previous frame. The drift is the
+    mean absolute difference over all pixels and channels, so a slow auto
+    exposure or white balance ramp adds up until it crosses `threshold`
+    and starts a new run, instead of passing as a string of small steps.
+    Once `stable_frames` frames in a row stay within `threshold` of the
+    run's first frame the camera has converged.
+
+    Frames darker than `min_brightness` or with less contrast than
+    `min_contrast` (the black or flat frames many webcams send while
+    starting up) never count as stable. `max_frames` and `max_seconds`
+    bound the wait for cameras that never settle, or when someone keeps
+    moving in view.
+    """
+
+    def __init__(self, threshold=2.0, stable_frames=5, max_frames=90, max_seconds=3.0, downscale=8,
+                 min_brightness=16.0, min_contrast=2.0):
+        if stable_frames < 1:
+            raise ValueError("stable_frames must be >= 1")
+        self.threshold = threshold
+        self.stable_frames = stable_frames
+        self.max_frames = max_frames
+        self.max_seconds = max_seconds
+        self.downscale = downscale
+        self.min_brightness = min_brightness
+        self.min_contrast = min_contrast
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.stable_count = 0
+        self.rejected = 0
+        self.last_usable = False
+        self.last_change = None
+        self.converged = False
+        self.timed_out = False
+        self._anchor = None
+        self._start = time.perf_counter()
+
+    @property
+    def done(self):
+        return self.converged or self.timed_out
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def usable(self, small):
+        """Whether a (downscaled) frame shows a picture rather than a black or flat startup frame"""
+        mean, stddev = cv2.meanStdDev(small)
+        return mean.mean() >= self.min_brightness and stddev.max() >= self.min_contrast
+
+    def update(self, frame):
+        """Add the next frame; returns False if it starts a new stable run (earlier frames should be dropped)"""
+        height, width = frame.shape[:2]
+        size = (max(1, width // self.downscale), max(1, height // self.downscale))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        self.frames += 1
+
+        settled = False
+        self.last_usable = self.usable(small)
+        if not self.last_usable:
+            self.rejected += 1
+            self.last_change = None
+            self._anchor = None
+        elif self._anchor is None:
+            # The first usable frame starts the run
+            self.last_change = None
+            self._anchor = small
+        else:
+            channels = small.shape[2] if small.ndim == 3 else 1
+            self.last_change = sum(cv2.mean(cv2.absdiff(small, self._anchor))[:channels]) / channels
+            settled = self.last_change <= self.threshold
+            if not settled:
+                # Drifted too far: this frame starts the next run
+                self._anchor = small
+
+        self.stable_count = self.stable_count + 1 if settled else 0
+        if self.stable_count >= self.stable_frames:
+            self.converged = True
+        elif self.frames >= self.max_frames or self.elapsed >= self.max_seconds:
+            self.timed_out = True
+        return settled